@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.api_v1.endpoints import login, users, license, license_domain, license_source, license_restriction
+from app.api.api_v1.endpoints import login, users, license, license_domain, license_source, license_restriction, license_job, metrics
 
 api_router = APIRouter()
 api_router.include_router(login.router, tags=["login"])
@@ -9,3 +9,5 @@ api_router.include_router(license.router, prefix="/license", tags=["license"])
 api_router.include_router(license_domain.router, prefix="/license/domain", tags=["license"])
 api_router.include_router(license_source.router, prefix="/license/source", tags=["license"])
 api_router.include_router(license_restriction.router, prefix="/license/restriction", tags=["license"])
+api_router.include_router(license_job.router, prefix="/license/job", tags=["license"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
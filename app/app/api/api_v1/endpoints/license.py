@@ -1,154 +1,191 @@
-from enum import Enum
-import os
-import tempfile
-from typing import Any, List, Optional
-
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import FileResponse, StreamingResponse
-from jinja2 import Template
-import pypandoc
-from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 import uuid as uuid_pkg
 from pathlib import Path
-from starlette.background import BackgroundTask
-from pathvalidate import validate_filename, ValidationError
-
-from dulwich.repo import Repo
-from dulwich.object_store import tree_lookup_path
 
 from app import crud, models
 from app.api import deps
+from app.api.pagination import paginate
+from app.core.cancellation import RenderCancelled, run_cancellable
+from app.core.config import settings
+from app.core.executor import ExecutorBusyError, render_lanes
+from app.core.jobs import job_runner
+from app.core.pandoc import ConversionTimeoutError, ConverterBusyError
 from app.core.rate_limiting import limiter
+from app.core.rendering import FILE_EXTENSIONS, MediaType, RenderContext, build_restriction_snapshot, etag_matches, generate_markdown, get_etag, get_filename, get_render_lane, get_template_file, invalidate_license, render_artifact, render_artifacts
+from app.core.streaming import iter_chunks, iter_zip
+from app.core.templates import TemplateVersionNotFound, current_template_sha
 
 
 
 router = APIRouter()
-repo = Repo.discover()
 
 BASE_DIR = Path(__file__).resolve().parent
 
-class MediaType(str, Enum):
-    plain = "text/plain"
-    latex = "text/latex"
-    markdown = "text/markdown"
-    rtf = "text/rtf"
-
+BUSY_DETAIL = "The license generator is busy. Please try again later."
+TEMPLATE_NOT_FOUND_DETAIL = "Template version not found. Please check the git_sha."
+# seconds after which clients should retry when the generator is busy
+RETRY_AFTER = "5"
+# nginx's status for requests whose client went away, nobody receives it
+CLIENT_CLOSED_REQUEST = 499
 
 
 @router.get("/", response_model=List[models.LicenseRead])
 def read_licenses(
+    response: Response,
     db: Session = Depends(deps.get_db),
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
     user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Retrieve licenses.
+    Pass the X-Next-Cursor header of a response as cursor to get the next page.
     """
-    all_licenses = crud.license.get_multi(db, skip=skip, limit=limit)
+    all_licenses = paginate(crud.license, db, response, cursor=cursor, skip=skip, limit=limit)
     return all_licenses
 
+async def _get_render_context(db: AsyncSession, id: uuid_pkg.UUID) -> RenderContext:
+    """
+    Read what rendering needs of license "id" and return the connection to
+    the pool, before the slow rendering and conversion start.
+    """
+    try:
+        license = await crud.license.aget(db, id)
+        if not license:
+            raise HTTPException(status_code=404, detail="License not found")
+        if license.restriction_snapshot is None:
+            # the restrictions cannot be loaded lazily on an async session
+            options = [selectinload(models.License.restrictions).selectinload(models.LicenseRestriction.domain)]
+            db.expunge(license)
+            license = await crud.license.aget(db, id, options=options)
+        return RenderContext.from_license(license)
+    finally:
+        await db.close()
+
+
 @router.get("/{id}/generate")
 @limiter.limit("5/minute")
 async def generate_license(
     request: Request,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     *,
     id: uuid_pkg.UUID,
     media_type: MediaType = "text/markdown",
-    git_sha: Optional[str] = None
+    git_sha: Optional[str] = Query(default=None, regex=models.GIT_SHA_PATTERN)
 ) -> Any:
     """
     Generate license text for license with id "id".
     In order to select a specific version of the license, you can provide a git_sha or 'head' to get the latest version locally.
+    Responses carry an ETag, send it as If-None-Match to get a 304 if the document did not change.
     """
-    license = crud.license.get(db, id=id)
-
-    restrictions = {}
-    for restriction in license.restrictions:
-        # put additional restriction in correct domain
-        # create if not exists
-        if restriction.domain.name not in restrictions:
-            restrictions[restriction.domain.name] = []
-        # append restriction
-        restrictions[restriction.domain.name].append(restriction.text)
-    
-     # deduplicate restrictions
-    for domain in restrictions:
-        # create index for each restriction with letters
-        restrictions[domain] = [[chr(97 + index), restriction] for index, restriction in enumerate(restrictions[domain])]
-
-    # construct array of licensed artifacts
-    artifacts = []
-    if license.application:
-        artifacts.append("Application")
-    if license.model:
-        artifacts.append("Model")
-    if license.sourcecode:
-        artifacts.append("Source Code")
-
-    short_artifact_name = "".join([artifact[0] for artifact in artifacts])
-
-    if license.license == "ResearchRAIL":
-        template_file = "ResearchUseRAIL.jinja"
-    elif license.license == "OpenRAIL":
-        template_file = "OpenRAIL-AMS.jinja"
-    elif license.license == "RAIL":
-        template_file = "RAIL-AMS.jinja"
+    media_type = MediaType(media_type)
+    # the license is read and conditional requests are answered without
+    # blocking the event loop, template lookup, rendering and conversion
+    # block, so they run in the render executor, they are aborted if the
+    # client disconnects in the meantime
+    license = await _get_render_context(db, id)
+    try:
+        filename = get_filename(license)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    headers = {"Content-Disposition": f"attachment; filename={filename}.{FILE_EXTENSIONS[media_type]}"}
+    if git_sha == "head":
+        # the local working copy can change at any time, so it is not cached anywhere
+        headers["Cache-Control"] = "no-store"
     else:
-        raise ValueError("Unknown license type")
-    
-    if git_sha != "head":
+        # even a url pinned to a template version changes with the license and
+        # with the renderer, caches revalidate, which the ETag keeps cheap
         git_sha = git_sha or license.git_commit_hash
-        commit = repo.get_object(git_sha.encode("ascii"))
-        # dulwich expects bytes instead of str
-        path = bytes("app/app/templates/" + template_file, "utf-8")
-        mode, sha = tree_lookup_path(repo.get_object, commit.tree, path)
-        file_object_at_creation_time = repo[sha].data.decode("utf-8")
-    else:
-        with open("/app/app/app/templates/" + template_file, "r") as template_file:
-            file_object_at_creation_time =  template_file.read()
-
-    
-    template = Template(file_object_at_creation_time)
-    rendered_text = template.render(
-        request=request,
-        ARTIFACTS=artifacts,
-        SHORT_ARTIFACT_NAME=short_artifact_name,
-        LICENSE_NAME=license.name,
-        RESTRICTIONS=restrictions,
-        LICENSE_TIMESTAMP=license.timestamp,
-        LICENSE_ID=license.id,
-        LICENSE_TEMPLATE_VERSION=license.git_commit_hash
-    )
+        headers["Cache-Control"] = "public, no-cache"
+        headers["ETag"] = get_etag(license, git_sha, media_type)
+        # answered right away, conditional requests never wait for a render lane
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers={key: value for key, value in headers.items() if key != "Content-Disposition"})
 
+    executor = render_lanes[get_render_lane([media_type])]
     try:
-        filename = license.name + "-" + license.license
-        # check if filename can be encodable and a proper filename for all platforms
-        filename.encode("latin1")
-        validate_filename(filename)
-    except (UnicodeEncodeError, ValidationError):
-        filename = license.license.encode("latin1")
-    except Exception as e:
-        print(e)
-        raise HTTPException(status_code=422, detail="The license name could not be encoded correctly. Please check the license name for special characters and contact the maintainers.")
-
-    if media_type == "text/markdown":
-        return StreamingResponse(iter(rendered_text), media_type="application/octet-stream", headers={"Content-Disposition": f"attachment; filename={filename}.md"})
-    if media_type == "text/plain":
-        return StreamingResponse(iter(pypandoc.convert_text(rendered_text, format='markdown', to='plain')), media_type="application/octet-stream", headers={"Content-Disposition": f"attachment; filename={filename}.txt"})
-    if  media_type == "text/rtf":
-        return StreamingResponse(iter(pypandoc.convert_text(rendered_text, format='markdown', to='rtf')), media_type="application/octet-stream", headers={"Content-Disposition": f"attachment; filename={filename}.rtf"})
-    if media_type == "text/latex":
-        return StreamingResponse(iter(pypandoc.convert_text(rendered_text, format='markdown', to='latex')), media_type="application/octet-stream", headers={"Content-Disposition": f"attachment; filename={filename}.latex"})
-    if media_type == "application/pdf":
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as output_file:
-            pypandoc.convert_text(rendered_text, format='markdown', outputfile=output_file.name, to='pdf')
-            def cleanup():
-                os.remove(output_file.name)
-            return FileResponse(output_file.name, media_type="application/pdf", filename="{filename}.pdf", background=BackgroundTask(cleanup))
+        return await run_cancellable(
+            executor.run, request.is_disconnected,
+            _generate_license, license, media_type, git_sha, headers,
+        )
+    except ExecutorBusyError:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL, headers={"Retry-After": RETRY_AFTER})
+    except RenderCancelled:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+def _generate_license(license: RenderContext, media_type: MediaType, git_sha: str, headers: Dict[str, str]) -> Response:
+    # pdf is served as such, all text formats are offered as a plain download
+    response_media_type = "application/pdf" if media_type == MediaType.pdf else "application/octet-stream"
+    if git_sha == "head" and media_type == MediaType.markdown:
+        # nothing to convert or cache, so the template is streamed while it renders
+        chunks = iter_chunks(generate_markdown(license, git_sha), settings.RENDER_CHUNK_SIZE)
+        return StreamingResponse(chunks, media_type="application/octet-stream", headers=headers)
+
+    try:
+        artifact = render_artifact(license, git_sha, media_type)
+    except TemplateVersionNotFound:
+        raise HTTPException(status_code=404, detail=TEMPLATE_NOT_FOUND_DETAIL)
+    except ConverterBusyError:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL, headers={"Retry-After": RETRY_AFTER})
+    except ConversionTimeoutError:
+        raise HTTPException(status_code=504, detail="The license could not be converted in time. Please try again later.")
+    # the size is known here, Response sends the body in one piece with a Content-Length
+    return Response(artifact, media_type=response_media_type, headers=headers)
             
 
+@router.get("/{id}/export")
+@limiter.limit("5/minute")
+async def export_license(
+    request: Request,
+    db: AsyncSession = Depends(deps.get_async_db),
+    *,
+    id: uuid_pkg.UUID,
+    media_types: List[MediaType] = Query(default=[MediaType.markdown, MediaType.plain, MediaType.rtf, MediaType.latex]),
+    git_sha: Optional[str] = Query(default=None, regex=models.GIT_SHA_PATTERN)
+) -> Any:
+    """
+    Download the license with id "id" in several formats at once as a zip archive.
+    The license is rendered once and converted to all requested media types.
+    """
+    license = await _get_render_context(db, id)
+    executor = render_lanes[get_render_lane(media_types)]
+    try:
+        return await run_cancellable(executor.run, request.is_disconnected, _export_license, license, media_types, git_sha)
+    except ExecutorBusyError:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL, headers={"Retry-After": RETRY_AFTER})
+    except RenderCancelled:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+def _export_license(license: RenderContext, media_types: List[MediaType], git_sha: Optional[str]) -> Response:
+    try:
+        filename = get_filename(license)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    git_sha = git_sha or license.git_commit_hash
+    try:
+        artifacts = render_artifacts(license, git_sha, media_types)
+    except TemplateVersionNotFound:
+        raise HTTPException(status_code=404, detail=TEMPLATE_NOT_FOUND_DETAIL)
+    except ConverterBusyError:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL, headers={"Retry-After": RETRY_AFTER})
+    except ConversionTimeoutError:
+        raise HTTPException(status_code=504, detail="The license could not be converted in time. Please try again later.")
+
+    files = ((f"{filename}.{FILE_EXTENSIONS[media_type]}", artifact) for media_type, artifact in artifacts.items())
+    headers = {"Content-Disposition": f"attachment; filename={filename}.zip"}
+    return StreamingResponse(iter_zip(files), media_type="application/zip", headers=headers)
+
+
 @router.post("/", response_model=models.LicenseRead)
 @limiter.limit("1/minute")
 def create_license(
@@ -160,15 +197,24 @@ def create_license(
     """
     Create new license .
     """
-    # get all restrictions with license_in.additionalRestrictions
-    restrictions = [crud.license_restriction.get(db=db, id=restriction_id) for restriction_id in license_in.restriction_ids]
-    if None in restrictions:
-        raise HTTPException(status_code=404, detail="One or more restrictions not found. Please check that you have the correct restriction ids.")
-    # filter Nones
-    new_license = crud.license.create(db=db, obj_in=license_in)
-    new_license.restrictions = restrictions
-    db.add(new_license)
-    db.commit()
+    # all restrictions in one query, in the order they were selected
+    restriction_ids = list(dict.fromkeys(license_in.restriction_ids))
+    found = {restriction.id: restriction for restriction in crud.license_restriction.get_approved_by_ids(db, ids=restriction_ids)}
+    if len(found) != len(restriction_ids):
+        raise HTTPException(status_code=404, detail="One or more restrictions not found or not approved. Please check that you have the correct restriction ids.")
+    restrictions = [found[restriction_id] for restriction_id in restriction_ids]
+    git_sha = current_template_sha()
+    revision = crud.template_version.get_revision(db, git_sha=git_sha, template_file=get_template_file(license_in))
+    new_license = crud.license.create_with_restrictions(
+        db,
+        obj_in=license_in,
+        restrictions=restrictions,
+        git_commit_hash=git_sha,
+        template_version_hash=revision.content_hash if revision else None,
+        restriction_snapshot=build_restriction_snapshot(restrictions),
+    )
+    # the first download usually follows right away, render it in the meantime
+    job_runner.prerender(new_license.id)
 
     return new_license
 
@@ -177,19 +223,20 @@ def create_license(
 def update_license(
     *,
     db: Session = Depends(deps.get_db),
-    id: int,
+    id: uuid_pkg.UUID,
     license_in: models.LicenseCreate,
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Update an license.
     """
-    license_ = crud.license_.get(db=db, id=id)
+    license_ = crud.license.get(db=db, id=id)
     if not license_:
         raise HTTPException(status_code=404, detail="License  not found")
     if not crud.user.is_superuser(current_user):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     updated_license = crud.license.update(db=db, db_obj=license_, obj_in=license_in)
+    invalidate_license(id)
     return updated_license
 
 
@@ -197,16 +244,17 @@ def update_license(
 def delete_license(
     *,
     db: Session = Depends(deps.get_db),
-    id: int,
+    id: uuid_pkg.UUID,
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Delete an license.
     """
-    license_ = crud.license_.get(db=db, id=id)
+    license_ = crud.license.get(db=db, id=id)
     if not license_:
         raise HTTPException(status_code=404, detail="License  not found")
     if not crud.user.is_superuser(current_user):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     deleted_license = crud.license.remove(db=db, id=id)
+    invalidate_license(id)
     return deleted_license
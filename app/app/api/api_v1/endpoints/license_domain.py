@@ -1,24 +1,29 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import crud, models
 from app.api import deps
+from app.api.pagination import apaginate
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[models.LicenseDomain])
-def read_domains(
-    db: Session = Depends(deps.get_db),
+async def read_domains(
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
 ) -> Any:
     """
     Retrieve license domains.
+    Pass the X-Next-Cursor header of a response as cursor to get the next page.
     """
-    all_license_domains = crud.license_domain.get_multi(db, skip=skip, limit=limit)
+    all_license_domains = await apaginate(crud.license_domain, db, response, cursor=cursor, skip=skip, limit=limit)
     return all_license_domains
 
 
@@ -0,0 +1,86 @@
+from typing import Any
+import uuid as uuid_pkg
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.api import deps
+from app.core.jobs import job_runner
+from app.core.rate_limiting import limiter
+from app.core.rendering import FILE_EXTENSIONS, MediaType, get_filename
+
+router = APIRouter()
+
+
+@router.post("/", response_model=models.RenderJobRead, status_code=202)
+@limiter.limit("5/minute")
+def create_job(
+    request: Request,
+    *,
+    db: Session = Depends(deps.get_db),
+    job_in: models.RenderJobCreate,
+) -> Any:
+    """
+    Queue the generation of a license document, e.g. a pdf.
+    Poll the job until its status is 'finished' and fetch the document from its download url.
+    """
+    try:
+        MediaType(job_in.media_type)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Unsupported media type")
+    license = crud.license.get(db, id=job_in.license_id)
+    if not license:
+        raise HTTPException(status_code=404, detail="License not found")
+    job = models.RenderJob(
+        license_id=license.id,
+        media_type=job_in.media_type,
+        git_sha=job_in.git_sha or license.git_commit_hash,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    job_runner.submit(job.id)
+    return job
+
+
+@router.get("/{id}", response_model=models.RenderJobRead)
+def read_job(
+    *,
+    db: Session = Depends(deps.get_db),
+    id: uuid_pkg.UUID,
+) -> Any:
+    """
+    Get the status of a render job.
+    """
+    job = crud.render_job.get(db, id=id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    return job
+
+
+@router.get("/{id}/download")
+def download_job(
+    *,
+    db: Session = Depends(deps.get_db),
+    id: uuid_pkg.UUID,
+) -> Any:
+    """
+    Download the document of a finished render job.
+    """
+    job = crud.render_job.get(db, id=id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    if job.status != "finished":
+        raise HTTPException(status_code=409, detail=f"Render job is {job.status}")
+    license = crud.license.get(db, id=job.license_id)
+    try:
+        filename = get_filename(license)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    media_type = MediaType(job.media_type)
+    headers = {"Content-Disposition": f"attachment; filename={filename}.{FILE_EXTENSIONS[media_type]}"}
+    # pdf is served as such, all text formats are offered as a plain download
+    response_media_type = "application/pdf" if media_type == MediaType.pdf else "application/octet-stream"
+    return Response(job.result, media_type=response_media_type, headers=headers)
@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends
+
+from app import models
+from app.api import deps
+from app.core import metrics
+
+router = APIRouter()
+
+
+@router.get("/")
+def read_metrics(
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Retrieve runtime metrics of the license generation path.
+    """
+    return metrics.collect()
@@ -1,12 +1,13 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
 from fastapi.encoders import jsonable_encoder
 from pydantic.networks import EmailStr
 from sqlalchemy.orm import Session
 
 from app import crud, models
 from app.api import deps
+from app.api.pagination import paginate
 from app.core.config import settings
 
 router = APIRouter()
@@ -14,15 +15,18 @@ router = APIRouter()
 
 @router.get("/", response_model=List[models.User])
 def read_users(
+    response: Response,
     db: Session = Depends(deps.get_db),
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Retrieve users.
+    Pass the X-Next-Cursor header of a response as cursor to get the next page.
     """
-    users = crud.user.get_multi(db, skip=skip, limit=limit)
+    users = paginate(crud.user, db, response, cursor=cursor, skip=skip, limit=limit)
     return users
 
 
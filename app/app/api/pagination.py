@@ -0,0 +1,74 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.crud.base import CRUDBase
+
+# response header with the cursor of the next page, missing on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _check(cursor: Optional[str], skip: int) -> None:
+    if skip and cursor is not None:
+        raise HTTPException(status_code=400, detail="skip cannot be combined with cursor")
+
+
+def _respond(crud_obj: CRUDBase, response: Response, rows: List[Any], next_cursor: Optional[str], skip: int, limit: int) -> List[Any]:
+    if skip and rows and len(rows) == limit:
+        next_cursor = crud_obj.encode_cursor(rows[-1])
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+def paginate(
+    crud_obj: CRUDBase,
+    db: Session,
+    response: Response,
+    *,
+    cursor: Optional[str],
+    skip: int,
+    limit: int,
+    filter: Optional[Dict[str, Any]] = {},
+) -> List[Any]:
+    """
+    A page of a list endpoint. Pages are selected with the cursor from the
+    previous page, skip is still supported but gets slower with every page.
+    """
+    _check(cursor, skip)
+    next_cursor = None
+    if skip:
+        rows = crud_obj.get_multi(db, skip=skip, limit=limit, filter=filter)
+    else:
+        try:
+            rows, next_cursor = crud_obj.get_page(db, cursor=cursor, limit=limit, filter=filter)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _respond(crud_obj, response, rows, next_cursor, skip, limit)
+
+
+async def apaginate(
+    crud_obj: CRUDBase,
+    db: AsyncSession,
+    response: Response,
+    *,
+    cursor: Optional[str],
+    skip: int,
+    limit: int,
+    filter: Optional[Dict[str, Any]] = {},
+) -> List[Any]:
+    """
+    Like paginate, on an async session.
+    """
+    _check(cursor, skip)
+    next_cursor = None
+    if skip:
+        rows = await crud_obj.aget_multi(db, skip=skip, limit=limit, filter=filter)
+    else:
+        try:
+            rows, next_cursor = await crud_obj.aget_page(db, cursor=cursor, limit=limit, filter=filter)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _respond(crud_obj, response, rows, next_cursor, skip, limit)
@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core import metrics
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ArtifactKey = Tuple[str, str, str, str]
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Size-capped on-disk LRU store for rendered artifacts.
+
+    Files are laid out as <directory>/<hash of license id>/<hash of key> so
+    that all artifacts of a license can be dropped at once. Only hashes end up
+    in paths, whatever the key components contain. The access order
+    is tracked in memory and seeded from the file modification times on start,
+    hits touch the file so that the order survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._index[path] = size
+            self._size += size
+
+    def _license_dir(self, license_id: str) -> str:
+        return os.path.join(self.directory, _digest(license_id))
+
+    def _path(self, key: ArtifactKey) -> str:
+        return os.path.join(self._license_dir(key[0]), _digest("\0".join(key)))
+
+    def get(self, key: ArtifactKey) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._forget(path)
+            return None
+        with self._lock:
+            self.hits += 1
+            # other worker processes may have written the file
+            if path not in self._index:
+                self._index[path] = len(data)
+                self._size += len(data)
+            self._index.move_to_end(path)
+        return data
+
+    def put(self, key: ArtifactKey, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so that readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._forget(path)
+            self._index[path] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def invalidate_license(self, license_id: str) -> None:
+        license_dir = self._license_dir(license_id)
+        prefix = license_dir + os.sep
+        with self._lock:
+            for path in [path for path in self._index if path.startswith(prefix)]:
+                self._remove(path)
+        # remove files that other worker processes have written as well
+        if os.path.isdir(license_dir):
+            for name in os.listdir(license_dir):
+                self._unlink(os.path.join(license_dir, name))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index.clear()
+            self._size = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    self._unlink(os.path.join(root, name))
+
+    def _forget(self, path: str) -> None:
+        size = self._index.pop(path, None)
+        if size is not None:
+            self._size -= size
+
+    def _remove(self, path: str) -> None:
+        self._forget(path)
+        self._unlink(path)
+
+    def _unlink(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._index:
+            path = next(iter(self._index))
+            self._remove(path)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "files": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ArtifactCache:
+    """
+    Two tiered cache of rendered license artifacts.
+
+    The rendered (and converted) document is a pure function of the license,
+    the template version and the media type, so artifacts are stored under
+    (license id, git sha, media type, version), where version is a digest of
+    everything the document depends on. A changed license is looked up under
+    a new version by every worker process, invalidating only frees the space
+    of its old artifacts.
+
+    Lookups go to the memory tier first and fall back to the disk tier, disk
+    hits are promoted to memory.
+    """
+
+    def __init__(self, memory_size: int, directory: Optional[str], disk_size: int):
+        self.memory = LRUCache(maxsize=memory_size)
+        self.disk = DiskCache(directory, disk_size) if directory else None
+
+    def get(self, license_id: Any, git_sha: str, media_type: str, version: str) -> Optional[bytes]:
+        key = (str(license_id), git_sha, media_type, version)
+        data = self.memory.get(key)
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self.memory.put(key, data)
+        return data
+
+    def put(self, license_id: Any, git_sha: str, media_type: str, version: str, data: bytes) -> None:
+        key = (str(license_id), git_sha, media_type, version)
+        self.memory.put(key, data)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, data)
+            except OSError as e:
+                # the disk tier is best effort, serving the request is more important
+                logger.warning("Could not write artifact to disk cache: %s", e)
+
+    def invalidate(self, license_id: Any) -> None:
+        license_id = str(license_id)
+        self.memory.invalidate(lambda key: key[0] == license_id)
+        if self.disk is not None:
+            self.disk.invalidate_license(license_id)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+artifact_cache = ArtifactCache(
+    memory_size=settings.ARTIFACT_CACHE_MEMORY_SIZE,
+    directory=settings.ARTIFACT_CACHE_DIR,
+    disk_size=settings.ARTIFACT_CACHE_DISK_SIZE,
+)
+metrics.register("artifact_cache", artifact_cache.stats)
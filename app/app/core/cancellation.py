@@ -0,0 +1,143 @@
+"""
+Cancellation of renders whose client went away.
+
+A render runs in the render executor under a CancelScope. The request
+handler cancels the scope once the client disconnected, the render then
+stops at its next stage boundary (check_cancelled) and running converters
+are aborted through the callbacks registered with on_cancel.
+"""
+import asyncio
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class RenderCancelled(Exception):
+    """The client that requested the render disconnected."""
+
+
+class CancelScope:
+    def __init__(self) -> None:
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise RenderCancelled()
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]) -> Iterator[None]:
+        with self._lock:
+            cancelled = self.cancelled
+            if not cancelled:
+                self._callbacks.append(callback)
+        if cancelled:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Call fn in this scope, unless the scope was cancelled while the call
+        was waiting for a worker.
+        """
+        self.check()
+        token = _current_scope.set(self)
+        try:
+            return fn(*args)
+        finally:
+            _current_scope.reset(token)
+
+
+_current_scope: "contextvars.ContextVar[Optional[CancelScope]]" = contextvars.ContextVar("cancel_scope", default=None)
+
+
+def check_cancelled() -> None:
+    """
+    Raise RenderCancelled if the current render was cancelled.
+    """
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.check()
+
+
+@contextmanager
+def on_cancel(callback: Callable[[], None]) -> Iterator[None]:
+    """
+    Call callback if the current render is cancelled while in this block.
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        yield
+        return
+    with scope.on_cancel(callback):
+        yield
+
+
+class RenderOutcomes:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.aborted = 0
+
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "completed": self.completed,
+            "aborted": self.aborted,
+        }
+
+
+render_outcomes = RenderOutcomes()
+metrics.register("renders", render_outcomes.stats)
+
+
+async def run_cancellable(
+    run: Callable[..., Awaitable[Any]],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    fn: Callable[..., Any],
+    *args: Any,
+) -> Any:
+    """
+    Run fn(*args) with run (e.g. render_executor.run) in a new CancelScope,
+    which is cancelled once is_disconnected() returns True. Raises
+    RenderCancelled if the render was aborted.
+    """
+    scope = CancelScope()
+    task = asyncio.ensure_future(run(scope.run, fn, *args))
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=settings.RENDER_DISCONNECT_POLL_INTERVAL)
+            if not task.done() and await is_disconnected():
+                scope.cancel()
+                break
+        # a cancelled render still has to stop before its worker is free again
+        result = await task
+    except RenderCancelled:
+        render_outcomes.count("aborted")
+        raise
+    render_outcomes.count("completed")
+    return result
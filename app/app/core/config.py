@@ -52,6 +52,27 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
 
+    # the same database for the async engine, with the asyncpg driver by default
+    SQLALCHEMY_ASYNC_DATABASE_URI: Optional[str] = None
+    # per process, the sync and the async engine each open up to
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # seconds after which connections are replaced, -1 keeps them
+    DB_POOL_RECYCLE: int = 1800
+    # seconds to wait for a connection before giving up
+    DB_POOL_TIMEOUT: float = 30
+
+    @validator("SQLALCHEMY_ASYNC_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        uri = str(values.get("SQLALCHEMY_DATABASE_URI") or "")
+        scheme, _, rest = uri.partition("://")
+        if scheme.split("+")[0] in ("postgres", "postgresql"):
+            return "postgresql+asyncpg://" + rest
+        return uri
+
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = None
     SMTP_HOST: Optional[str] = None
@@ -83,6 +104,73 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER_PASSWORD: str
     USERS_OPEN_REGISTRATION: bool = False
 
+    # license generation
+    # template version of new licenses, defaults to HEAD of the repository or,
+    # without a checkout, to the newest commit in the template registry
+    TEMPLATE_GIT_SHA: Optional[str] = None
+    # number of compiled (template file, git sha) pairs kept in memory
+    TEMPLATE_CACHE_SIZE: int = 32
+    # number of rendered artifacts kept in memory
+    ARTIFACT_CACHE_MEMORY_SIZE: int = 256
+    # directory of the on-disk artifact cache, the disk tier is disabled if empty
+    ARTIFACT_CACHE_DIR: Optional[str] = "/tmp/rail-artifact-cache"
+    ARTIFACT_CACHE_DISK_SIZE: int = 512 * 1024 * 1024
+    # number of parsed (license, git sha) documents kept in memory as pandoc json AST
+    AST_CACHE_SIZE: int = 64
+    # number of threads that render licenses and of requests that may wait for one,
+    # for cheap formats (markdown, plain text)
+    RENDER_WORKERS: int = 4
+    RENDER_QUEUE_SIZE: int = 32
+    # the same for formats converted by pandoc (rtf, latex) and for pdf, each
+    # in a lane of their own so that they never delay cheap formats
+    CONVERT_LANE_WORKERS: int = 2
+    CONVERT_LANE_QUEUE_SIZE: int = 16
+    PDF_LANE_WORKERS: int = 1
+    PDF_LANE_QUEUE_SIZE: int = 8
+    # minimum number of characters per chunk when streaming rendered licenses
+    RENDER_CHUNK_SIZE: int = 64 * 1024
+    # seconds between checks whether the client of a running render disconnected
+    RENDER_DISCONNECT_POLL_INTERVAL: float = 0.5
+    # number of long-lived pandoc converters and of requests that may wait for one
+    PANDOC_POOL_SIZE: int = 2
+    PANDOC_POOL_QUEUE_SIZE: int = 16
+    # the same for pdf conversions, which run a pdf engine each and have
+    # converters of their own, so that they never hold those of other formats
+    PDF_POOL_SIZE: int = 1
+    PDF_POOL_QUEUE_SIZE: int = 8
+    # seconds to wait for a converter and for a single conversion
+    PANDOC_TIMEOUT: float = 30
+    # use `pandoc server` processes, falls back to a process per conversion if unavailable
+    PANDOC_SERVER: bool = True
+    # background render jobs
+    JOB_WORKERS: int = 2
+    JOB_MAX_ATTEMPTS: int = 3
+    # seconds between two polls for pending jobs, also the delay before a retry
+    JOB_POLL_INTERVAL: float = 5
+    # finished and failed jobs are removed after this many hours
+    JOB_RESULT_TTL_HOURS: int = 24
+    # seconds after which a running job is considered lost and queued again,
+    # it has to exceed the longest render: parsing and converting may each
+    # wait PANDOC_TIMEOUT for a converter and take PANDOC_TIMEOUT to convert
+    JOB_TIMEOUT: float = 300
+
+    @validator("JOB_TIMEOUT")
+    def job_timeout_exceeds_renders(cls, v: float, values: Dict[str, Any]) -> float:
+        longest_render = 4 * values.get("PANDOC_TIMEOUT", 0)
+        if v <= longest_render:
+            raise ValueError(f"JOB_TIMEOUT has to exceed the longest render of {longest_render} seconds")
+        return v
+
+    # media types that are rendered into the artifact cache right after a
+    # license is created, as its first download usually follows within seconds
+    PRERENDER_MEDIA_TYPES: List[str] = ["text/markdown", "text/plain", "text/rtf", "text/latex"]
+
+    @validator("ARTIFACT_CACHE_DIR", pre=True)
+    def artifact_cache_dir_can_be_blank(cls, v: Optional[str]) -> Optional[str]:
+        if not v:
+            return None
+        return v
+
     class Config:
         case_sensitive = True
 
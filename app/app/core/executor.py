@@ -0,0 +1,118 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class ExecutorBusyError(Exception):
+    """All workers are busy and the wait queue of the executor is full."""
+
+
+class RenderExecutor:
+    """
+    Dedicated thread pool for the blocking parts of license generation
+    (database reads, git object reads, jinja rendering and conversion), so
+    that they do not stall the event loop.
+
+    At most max_workers jobs run at the same time and at most queue_size jobs
+    wait for a worker, further jobs are rejected right away with
+    ExecutorBusyError.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int, name: str = "render"):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _call(self, fn: Callable[..., Any]) -> Any:
+        with self._lock:
+            self.active += 1
+        try:
+            result = fn()
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.active -= 1
+        with self._lock:
+            self.completed += 1
+        return result
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            if self.pending >= self.max_workers + self.queue_size:
+                self.rejected += 1
+                raise ExecutorBusyError()
+            self.pending += 1
+        try:
+            future = self._executor.submit(self._call, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._done(None)
+            raise
+        # a job is done once it actually finished, even if the awaiting request
+        # has been cancelled in the meantime, or once it has been cancelled
+        # before a worker picked it up
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _done(self, future: Optional["Future[Any]"]) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        # jobs that were already accepted still finish, a fresh pool is left
+        # behind so that the app can be started again in the same process
+        # (e.g. by the test client)
+        executor = self._executor
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "queue_size": self.queue_size,
+            "queue_depth": self.pending - self.active,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+render_executor = RenderExecutor(
+    max_workers=settings.RENDER_WORKERS,
+    queue_size=settings.RENDER_QUEUE_SIZE,
+)
+metrics.register("render_executor", render_executor.stats)
+
+# expensive formats run in lanes of their own, so that a burst of them only
+# ever waits for and is rejected by its own lane, render_executor is the
+# lane of everything cheap
+render_lanes: Dict[str, RenderExecutor] = {
+    "fast": render_executor,
+    "convert": RenderExecutor(
+        max_workers=settings.CONVERT_LANE_WORKERS,
+        queue_size=settings.CONVERT_LANE_QUEUE_SIZE,
+        name="convert",
+    ),
+    "pdf": RenderExecutor(
+        max_workers=settings.PDF_LANE_WORKERS,
+        queue_size=settings.PDF_LANE_QUEUE_SIZE,
+        name="pdf",
+    ),
+}
+for lane in ["convert", "pdf"]:
+    metrics.register("render_executor_" + lane, render_lanes[lane].stats)
@@ -0,0 +1,237 @@
+"""
+License templates split into static and dynamic fragments.
+
+Most of a template is fixed legal text, only a few blocks depend on the
+license. Templates are split at top-level markdown blocks into fragments,
+static fragments are kept pre-encoded and are converted by pandoc once per
+template version and output format. A document is then rendered by only
+rendering the dynamic fragments and converted by only converting those,
+in a single pandoc call, and joining them with the static parts.
+"""
+import logging
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core import metrics
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.templates import TEMPLATE_DIR, load_template_source
+
+logger = logging.getLogger(__name__)
+
+# output that pandoc puts between two converted top-level blocks
+BLOCK_SEPARATORS = {
+    "latex": "\n",
+    "rtf": "",
+}
+
+# paragraph between the dynamic fragments of a document, so that they are
+# converted in a single pandoc call and can be told apart afterwards
+FRAGMENT_BREAK = "RAILFRAGMENTBREAK"
+
+_JINJA = re.compile(r"{[{%#]")
+_JINJA_BLOCK = re.compile(r"{%-?\s*(\w+)")
+_JINJA_BLOCK_TAGS = {"for", "if", "macro", "call", "filter", "block", "with", "raw"}
+_FENCE = re.compile(r"^(?:~~~|```)")
+# list items continue the list of the block before them
+_LIST_ITEM = re.compile(r"^(?:[-*+]|\(?[0-9a-zA-Z#]{1,9}[.)])(?:\s|$)")
+
+Converter = Callable[[str, str], str]
+
+
+def split_fragments(source: str) -> List[str]:
+    """
+    Split template source into fragments that start with a top-level
+    markdown block, so that each of them can be converted on its own.
+    Jinja blocks, code blocks and lists are never split.
+    """
+    fragments: List[str] = []
+    current = ""
+    depth = 0
+    fenced = False
+    previous_blank = False
+    for line in source.splitlines(keepends=True):
+        blank = not line.strip()
+        if (
+            current and previous_blank and not blank and depth == 0 and not fenced
+            and not line[0].isspace() and not _LIST_ITEM.match(line)
+        ):
+            fragments.append(current)
+            current = ""
+        current += line
+        if _FENCE.match(line):
+            fenced = not fenced
+        for tag in _JINJA_BLOCK.findall(line):
+            if tag in _JINJA_BLOCK_TAGS:
+                depth += 1
+            elif tag.startswith("end"):
+                depth -= 1
+        previous_blank = blank
+    if current:
+        fragments.append(current)
+    return fragments
+
+
+def _convert_batch(texts: List[str], to: str, converter: Converter) -> Optional[List[str]]:
+    """
+    Convert several markdown documents with a single pandoc call. None if
+    the result cannot be split back into the documents.
+    """
+    if not texts:
+        return []
+    if any(FRAGMENT_BREAK in text for text in texts):
+        return None
+    separator = BLOCK_SEPARATORS[to]
+    output = converter(("\n\n" + FRAGMENT_BREAK + "\n\n").join(texts), to)
+    parts = re.split(r"[^\n]*%s[^\n]*\n" % FRAGMENT_BREAK, output)
+    if len(parts) != len(texts):
+        return None
+    converted = []
+    for index, part in enumerate(parts):
+        if index > 0 and separator:
+            part = part.removeprefix(separator)
+        if index < len(parts) - 1 and separator:
+            part = part.removesuffix(separator)
+        converted.append(part)
+    return converted
+
+
+class FragmentedTemplate:
+    """
+    A template version split into static and dynamic fragments.
+
+    Assembling the converted fragments only yields the conversion of the
+    whole document if no fragment changes how pandoc reads another one.
+    The first conversion to each format is therefore checked against a
+    conversion of the whole document, formats that differ are not assembled.
+    """
+
+    def __init__(self, source: str):
+        from jinja2 import Template
+
+        # jinja normalizes the line endings of the template text, templates
+        # in git use windows line endings
+        fragments = split_fragments(re.sub(r"\r\n|\r", "\n", source))
+        # jinja drops the trailing newline of a template
+        if fragments and fragments[-1].endswith("\n"):
+            fragments[-1] = fragments[-1][:-1]
+        self.fragments: List[Any] = []
+        # merge neighbouring fragments of the same kind
+        static: List[str] = []
+        dynamic: List[str] = []
+        for fragment in fragments:
+            if _JINJA.search(fragment):
+                if static:
+                    self.fragments.append("".join(static))
+                    static = []
+                dynamic.append(fragment)
+            else:
+                if dynamic:
+                    self.fragments.append(Template("".join(dynamic), keep_trailing_newline=True))
+                    dynamic = []
+                static.append(fragment)
+        if static:
+            self.fragments.append("".join(static))
+        if dynamic:
+            self.fragments.append(Template("".join(dynamic), keep_trailing_newline=True))
+        self.encoded = [fragment.encode("utf-8") if isinstance(fragment, str) else None for fragment in self.fragments]
+        self._converted: Dict[str, List[Optional[str]]] = {}
+        self._verified: Set[str] = set()
+        self._unsupported: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def render(self, context: Dict[str, Any]) -> "RenderedDocument":
+        parts = [fragment if isinstance(fragment, str) else fragment.render(**context) for fragment in self.fragments]
+        return RenderedDocument(self, parts)
+
+    def assembles(self, to: str) -> bool:
+        return to in BLOCK_SEPARATORS and to not in self._unsupported
+
+    def _static_conversions(self, to: str, converter: Converter) -> Optional[List[Optional[str]]]:
+        converted = self._converted.get(to)
+        if converted is not None:
+            return converted
+        static = [fragment for fragment in self.fragments if isinstance(fragment, str)]
+        batch = _convert_batch(static, to, converter)
+        if batch is None:
+            return None
+        outputs = iter(batch)
+        converted = [next(outputs) if isinstance(fragment, str) else None for fragment in self.fragments]
+        with self._lock:
+            self._converted[to] = converted
+        return converted
+
+    def convert(self, document: "RenderedDocument", to: str, converter: Converter) -> str:
+        """
+        Convert a document that was rendered from this template to the
+        pandoc output format "to" with converter(markdown, to).
+        """
+        if not self.assembles(to):
+            return converter(document.markdown, to)
+        static = self._static_conversions(to, converter)
+        dynamic_indexes = [index for index, fragment in enumerate(self.fragments) if not isinstance(fragment, str)]
+        dynamic = _convert_batch([document.parts[index] for index in dynamic_indexes], to, converter)
+        if static is None or dynamic is None:
+            return converter(document.markdown, to)
+        outputs = list(static)
+        for index, output in zip(dynamic_indexes, dynamic):
+            outputs[index] = output
+        assembled = BLOCK_SEPARATORS[to].join(output for output in outputs if output)
+        if to in self._verified:
+            return assembled
+        whole = converter(document.markdown, to)
+        with self._lock:
+            if whole == assembled:
+                self._verified.add(to)
+            else:
+                logger.warning("Converted fragments differ from the converted document for %s, converting documents as a whole", to)
+                self._unsupported.add(to)
+        return whole
+
+
+class RenderedDocument:
+    """
+    The rendered fragments of a document.
+    """
+
+    def __init__(self, template: FragmentedTemplate, parts: List[str]):
+        self.template = template
+        self.parts = parts
+        self._markdown: Optional[str] = None
+
+    @property
+    def markdown(self) -> str:
+        if self._markdown is None:
+            self._markdown = "".join(self.parts)
+        return self._markdown
+
+    def encode(self) -> bytes:
+        return b"".join(
+            encoded if encoded is not None else part.encode("utf-8")
+            for encoded, part in zip(self.template.encoded, self.parts)
+        )
+
+    def assembles(self, to: str) -> bool:
+        return self.template.assembles(to)
+
+    def convert(self, to: str, converter: Converter) -> str:
+        return self.template.convert(self, to, converter)
+
+
+fragment_cache = LRUCache(maxsize=settings.TEMPLATE_CACHE_SIZE)
+metrics.register("fragment_cache", fragment_cache.stats)
+
+
+def get_fragmented_template(template_file: str, git_sha: str, content_hash: Optional[str] = None) -> FragmentedTemplate:
+    """
+    Like get_template, but split into fragments.
+    """
+    if git_sha == "head":
+        key = (template_file, git_sha, os.stat(TEMPLATE_DIR + template_file).st_mtime_ns)
+    else:
+        key = (template_file, git_sha)
+    return fragment_cache.get_or_create(
+        key, lambda: FragmentedTemplate(load_template_source(template_file, git_sha, content_hash))
+    )
@@ -0,0 +1,188 @@
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+import uuid as uuid_pkg
+
+from app import crud
+from app.core import metrics
+from app.core.config import settings
+from app.core.rendering import MediaType, RenderContext, render_artifact, render_artifacts
+from app.db.session import Session
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """
+    Renders queued RenderJobs in a local thread pool.
+
+    Jobs are persisted in the database, so that any replica can report their
+    status and serve their result. Newly created jobs are submitted directly,
+    a poller thread additionally picks up jobs that are still pending (e.g.
+    from a restarted process or waiting for a retry), requeues jobs whose
+    worker vanished and removes expired results.
+
+    The same pool pre-renders new licenses into the artifact cache, these
+    are not persisted, a lost pre-render only costs a cache miss.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_attempts: int,
+        poll_interval: float,
+        result_ttl: datetime.timedelta,
+        job_timeout: datetime.timedelta,
+        prerender_media_types: List[MediaType],
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.job_timeout = job_timeout
+        self.prerender_media_types = prerender_media_types
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-job")
+        self._in_flight: Set[uuid_pkg.UUID] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        self.finished = 0
+        self.failed = 0
+        self.retried = 0
+        self.expired = 0
+        self.prerendered = 0
+        self.prerender_failed = 0
+
+    def submit(self, job_id: uuid_pkg.UUID) -> None:
+        with self._lock:
+            if job_id in self._in_flight:
+                return
+            self._in_flight.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id: uuid_pkg.UUID) -> None:
+        try:
+            with Session() as db:
+                job = crud.render_job.claim(db, id=job_id, max_attempts=self.max_attempts)
+                if not job:
+                    return
+                attempts, git_sha, media_type = job.attempts, job.git_sha, job.media_type
+                license = crud.license.get(db, id=job.license_id)
+                context = RenderContext.from_license(license) if license else None
+            # the connection is back in the pool while rendering, the job is
+            # read again to store the outcome
+            result = error = None
+            try:
+                if context is None:
+                    raise ValueError("License not found")
+                result = render_artifact(context, git_sha, MediaType(media_type))
+            except Exception as e:
+                logger.warning("Render job %s failed on attempt %s: %s", job_id, attempts, e)
+                error = str(e)
+            with Session() as db:
+                job = crud.render_job.get(db, id=job_id)
+                if not job:
+                    return
+                if error is None:
+                    job.result = result
+                    job.status = "finished"
+                    job.error = None
+                    outcome = "finished"
+                else:
+                    job.error = error
+                    job.status = "pending" if attempts < self.max_attempts else "failed"
+                    outcome = "retried" if job.status == "pending" else "failed"
+                now = datetime.datetime.now(datetime.timezone.utc)
+                job.updated_at = now
+                if job.status in ("finished", "failed"):
+                    job.finished_at = now
+                db.add(job)
+                db.commit()
+            with self._lock:
+                setattr(self, outcome, getattr(self, outcome) + 1)
+        except Exception:
+            logger.exception("Render job %s could not be processed", job_id)
+        finally:
+            with self._lock:
+                self._in_flight.discard(job_id)
+
+    def prerender(self, license_id: uuid_pkg.UUID) -> None:
+        """
+        Render a newly created license in the background, so that its first
+        download is served from the artifact cache.
+        """
+        if self.prerender_media_types:
+            self._executor.submit(self._prerender, license_id)
+
+    def _prerender(self, license_id: uuid_pkg.UUID) -> None:
+        try:
+            with Session() as db:
+                license = crud.license.get(db, id=license_id)
+                if not license:
+                    return
+                context = RenderContext.from_license(license)
+            render_artifacts(context, context.git_commit_hash, self.prerender_media_types)
+            with self._lock:
+                self.prerendered += 1
+        except Exception:
+            logger.exception("Pre-rendering license %s failed", license_id)
+            with self._lock:
+                self.prerender_failed += 1
+
+    def poll(self) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with Session() as db:
+            # a running job is only updated when it is done, so anything
+            # running for longer than any render can take has lost its worker
+            crud.render_job.requeue_stale(db, older_than=now - self.job_timeout, max_attempts=self.max_attempts)
+            expired = crud.render_job.remove_expired(db, older_than=now - self.result_ttl)
+            pending = crud.render_job.get_pending_ids(db, limit=self.workers * 4)
+        with self._lock:
+            self.expired += expired
+        for job_id in pending:
+            self.submit(job_id)
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Polling render jobs failed")
+
+    def start(self) -> None:
+        if self._poller is not None:
+            return
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll_loop, name="render-job-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "in_flight": len(self._in_flight),
+            "finished": self.finished,
+            "failed": self.failed,
+            "retried": self.retried,
+            "expired": self.expired,
+            "prerendered": self.prerendered,
+            "prerender_failed": self.prerender_failed,
+        }
+
+
+job_runner = JobRunner(
+    workers=settings.JOB_WORKERS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    result_ttl=datetime.timedelta(hours=settings.JOB_RESULT_TTL_HOURS),
+    job_timeout=datetime.timedelta(seconds=settings.JOB_TIMEOUT),
+    prerender_media_types=[MediaType(media_type) for media_type in settings.PRERENDER_MEDIA_TYPES],
+)
+metrics.register("render_jobs", job_runner.stats)
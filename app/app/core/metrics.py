@@ -0,0 +1,13 @@
+from typing import Any, Callable, Dict
+
+# components of the generation path register a callable here that returns
+# a json serialisable snapshot of their counters
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register(name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+    _collectors[name] = collector
+
+
+def collect() -> Dict[str, Dict[str, Any]]:
+    return {name: collector() for name, collector in _collectors.items()}
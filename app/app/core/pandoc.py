@@ -0,0 +1,414 @@
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from app.core import metrics
+from app.core.cancellation import RenderCancelled, check_cancelled, on_cancel
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ConverterBusyError(Exception):
+    """The wait queue of the converter pool is full."""
+
+
+class ConversionTimeoutError(Exception):
+    """No converter became available or the conversion took too long."""
+
+
+def run_pandoc(pandoc_path: str, text: str, from_format: str, to: str, timeout: float) -> bytes:
+    """
+    Convert text with a pandoc process and return its stdout, also for
+    binary formats such as pdf.
+
+    pandoc runs in a temporary directory of its own, which is removed
+    afterwards, so that the files of the pdf engine are removed even if
+    pandoc was killed. pandoc is killed if the render is cancelled.
+    """
+    with tempfile.TemporaryDirectory(prefix="pandoc-") as tmp:
+        with subprocess.Popen(
+            [pandoc_path, "--from=" + from_format, "--to=" + to, "--output=-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=tmp,
+            env=dict(os.environ, TMPDIR=tmp),
+        ) as process:
+            try:
+                with on_cancel(process.kill):
+                    stdout, stderr = process.communicate(text.encode("utf-8"), timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                raise
+    check_cancelled()
+    if process.returncode != 0:
+        raise RuntimeError("pandoc failed: %s" % stderr.decode("utf-8", errors="replace"))
+    return stdout
+
+
+def _abort(connection: http.client.HTTPConnection) -> None:
+    if connection.sock is not None:
+        try:
+            connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class PandocServerWorker:
+    """
+    A long-lived `pandoc server` process that is talked to over a persistent
+    http connection, so that no process has to be started per conversion.
+    """
+
+    mode = "server"
+
+    def __init__(self, pandoc_path: str, timeout: float):
+        self.pandoc_path = pandoc_path
+        self.timeout = timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.port = 0
+        self._connection: Optional[http.client.HTTPConnection] = None
+
+    def start(self) -> None:
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            [self.pandoc_path, "server", "--port", str(self.port), "--timeout", str(int(self.timeout))],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 5
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("pandoc server exited with code %s" % self.process.returncode)
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("pandoc server did not start listening")
+                time.sleep(0.05)
+        # make sure the server is actually able to convert documents
+        try:
+            self.convert("*health check*", "plain", 5)
+        except Exception:
+            self.stop()
+            raise
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def convert(self, text: str, to: str, timeout: float, from_format: str = "markdown") -> str:
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=timeout)
+        self._connection.timeout = timeout
+        body = json.dumps({"text": text, "from": from_format, "to": to})
+        connection = self._connection
+        try:
+            # the server keeps running, only waiting for its answer is aborted
+            with on_cancel(lambda: _abort(connection)):
+                connection.request(
+                    "POST",
+                    "/",
+                    body=body.encode("utf-8"),
+                    headers={"Content-Type": "application/json", "Accept": "application/json"},
+                )
+                response = connection.getresponse()
+                payload = response.read()
+        except Exception:
+            self._connection.close()
+            self._connection = None
+            raise
+        if response.status != 200:
+            raise RuntimeError("pandoc server returned %s: %s" % (response.status, payload[:200]))
+        result = json.loads(payload)
+        if "error" in result:
+            raise RuntimeError("pandoc server failed: %s" % result["error"])
+        return result["output"]
+
+    def convert_binary(self, text: str, to: str, timeout: float, from_format: str = "markdown") -> bytes:
+        # the server only produces text formats
+        return run_pandoc(self.pandoc_path, text, from_format, to, timeout)
+
+    def stop(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+class SubprocessWorker:
+    """
+    Fallback for pandoc builds without server support, every conversion
+    starts a new pandoc process.
+    """
+
+    mode = "subprocess"
+
+    def __init__(self, pandoc_path: str):
+        self.pandoc_path = pandoc_path
+
+    def start(self) -> None:
+        pass
+
+    def alive(self) -> bool:
+        return True
+
+    def convert(self, text: str, to: str, timeout: float, from_format: str = "markdown") -> str:
+        return run_pandoc(self.pandoc_path, text, from_format, to, timeout).decode("utf-8")
+
+    def convert_binary(self, text: str, to: str, timeout: float, from_format: str = "markdown") -> bytes:
+        return run_pandoc(self.pandoc_path, text, from_format, to, timeout)
+
+    def stop(self) -> None:
+        pass
+
+
+Worker = Union[PandocServerWorker, SubprocessWorker]
+T = TypeVar("T")
+
+
+class ConverterPool:
+    """
+    Fixed size pool of pandoc converters with a bounded wait queue.
+
+    Workers are started lazily on the first conversion. Requests that would
+    exceed the wait queue are rejected with ConverterBusyError instead of
+    piling up, crashed or hanging workers are replaced. A worker that could
+    not be replaced leaves its slot vacant, the next acquire starts a worker
+    for it.
+    """
+
+    def __init__(self, size: int, queue_size: int, timeout: float, use_server: bool = True):
+        self.size = size
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.use_server = use_server
+        self._idle: "queue.Queue[Worker]" = queue.Queue()
+        self._workers: List[Worker] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self.vacant = 0
+        self.waiting = 0
+        self.active = 0
+        self.conversions = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.restarts = 0
+        self.conversion_seconds_total = 0.0
+        self.conversion_seconds_max = 0.0
+
+    def _new_worker(self) -> Worker:
+        # imported on first use, it is not needed to serve cached artifacts
+        import pypandoc
+
+        pandoc_path = pypandoc.get_pandoc_path()
+        if self.use_server:
+            worker = PandocServerWorker(pandoc_path, self.timeout)
+            try:
+                worker.start()
+                return worker
+            except Exception as e:
+                # far slower, it is what pandoc before 3.0 (e.g. Debian's) ends up with
+                logger.error(
+                    "pandoc server unavailable (pandoc %s, server mode needs 3.0 or newer), "
+                    "every conversion starts a pandoc process of its own: %s",
+                    pypandoc.get_pandoc_version(), e,
+                )
+                self.use_server = False
+        return SubprocessWorker(pandoc_path)
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            worker = self._new_worker()
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    def _replace(self, worker: Worker) -> Worker:
+        """
+        Stop worker and start a new one in its place. If that fails, worker
+        is removed from the pool and its slot is left vacant.
+        """
+        worker.stop()
+        try:
+            new_worker = self._new_worker()
+        except Exception:
+            with self._lock:
+                self._workers.remove(worker)
+                self.vacant += 1
+            raise
+        with self._lock:
+            self.restarts += 1
+            self._workers[self._workers.index(worker)] = new_worker
+        return new_worker
+
+    def _refill(self) -> Optional[Worker]:
+        with self._lock:
+            if not self.vacant or not self._idle.empty():
+                return None
+            self.vacant -= 1
+        try:
+            worker = self._new_worker()
+        except Exception:
+            with self._lock:
+                self.vacant += 1
+            raise
+        with self._lock:
+            self.restarts += 1
+            self._workers.append(worker)
+        return worker
+
+    def _acquire(self, timeout: float) -> Worker:
+        worker = self._refill()
+        if worker is not None:
+            return worker
+        with self._lock:
+            if self.waiting >= self.queue_size and self._idle.empty():
+                self.rejected += 1
+                raise ConverterBusyError()
+            self.waiting += 1
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise ConversionTimeoutError()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def convert(self, text: str, to: str, timeout: Optional[float] = None, from_format: str = "markdown") -> str:
+        """
+        Convert text from the pandoc input format from_format (markdown by
+        default) to the pandoc output format "to".
+        """
+        return self._run(lambda worker, timeout: worker.convert(text, to, timeout, from_format), timeout)
+
+    def convert_binary(self, text: str, to: str, timeout: Optional[float] = None, from_format: str = "markdown") -> bytes:
+        """
+        Like convert, for binary output formats such as pdf. The document is
+        read from pandoc's stdout, no output file is written.
+        """
+        return self._run(lambda worker, timeout: worker.convert_binary(text, to, timeout, from_format), timeout)
+
+    def _run(self, conversion: Callable[[Worker, float], T], timeout: Optional[float]) -> T:
+        check_cancelled()
+        self._ensure_started()
+        timeout = timeout or self.timeout
+        worker = self._acquire(timeout)
+        with self._lock:
+            self.active += 1
+        start = time.perf_counter()
+        try:
+            if not worker.alive():
+                worker = self._replace(worker)
+            try:
+                check_cancelled()
+                return conversion(worker, timeout)
+            except socket.timeout:
+                # an OSError as well, but the worker is stuck rather than crashed
+                raise
+            except (OSError, http.client.HTTPException):
+                # an aborted conversion looks like a crash
+                check_cancelled()
+                # the worker crashed in the middle of the conversion, retry once
+                worker = self._replace(worker)
+                return conversion(worker, timeout)
+        except RenderCancelled:
+            with self._lock:
+                self.cancelled += 1
+            raise
+        except (subprocess.TimeoutExpired, socket.timeout):
+            with self._lock:
+                self.timeouts += 1
+            # a server that did not answer in time is likely stuck
+            try:
+                worker = self._replace(worker)
+            except Exception as e:
+                logger.warning("Could not replace a pandoc worker: %s", e)
+            raise ConversionTimeoutError()
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.active -= 1
+                self.conversions += 1
+                self.conversion_seconds_total += elapsed
+                self.conversion_seconds_max = max(self.conversion_seconds_max, elapsed)
+            # workers that could not be replaced, or were shut down, are not reused
+            with self._lock:
+                reuse = worker in self._workers
+            if reuse:
+                self._idle.put(worker)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._started = False
+            self.vacant = 0
+        for worker in workers:
+            worker.stop()
+        self._idle = queue.Queue()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "server" if self.use_server else "subprocess",
+            "size": self.size,
+            "vacant": self.vacant,
+            "queue_depth": self.waiting,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "conversions": self.conversions,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "restarts": self.restarts,
+            "conversion_seconds_total": self.conversion_seconds_total,
+            "conversion_seconds_max": self.conversion_seconds_max,
+        }
+
+
+converter_pool = ConverterPool(
+    size=settings.PANDOC_POOL_SIZE,
+    queue_size=settings.PANDOC_POOL_QUEUE_SIZE,
+    timeout=settings.PANDOC_TIMEOUT,
+    use_server=settings.PANDOC_SERVER,
+)
+metrics.register("converter_pool", converter_pool.stats)
+
+# pandoc server does not write pdf, so its converters are plain subprocesses
+pdf_converter_pool = ConverterPool(
+    size=settings.PDF_POOL_SIZE,
+    queue_size=settings.PDF_POOL_QUEUE_SIZE,
+    timeout=settings.PANDOC_TIMEOUT,
+    use_server=False,
+)
+metrics.register("converter_pool_pdf", pdf_converter_pool.stats)
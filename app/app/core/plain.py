@@ -0,0 +1,451 @@
+"""
+Markdown to plain text conversion without pandoc.
+
+The license templates use a small subset of pandoc's markdown: ~~~ fenced
+blocks, ### headings, single line paragraphs, bullet lists, decimal and (a)
+lettered lists, **strong** text and smart punctuation. For documents within
+that subset markdown_to_plain produces the same output as pandoc's plain
+writer. Everything else raises UnsupportedMarkdown, so that callers can fall
+back to pandoc instead of producing a slightly different document.
+"""
+import logging
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.pandoc import converter_pool
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedMarkdown(ValueError):
+    """The document uses markdown that is only converted by pandoc."""
+
+
+# line width of pandoc's plain writer
+WIDTH = 72
+
+# pandoc's default abbreviations, which are followed by a non-breaking space
+ABBREVIATIONS = frozenset("""
+    aet. aetat. al. Apr. Aug. bk. Bros. c. Capt. cf. ch. chap. chs. Co. col.
+    Corp. cp. d. Dec. Dr. e.g. ed. eds. esp. f. fasc. Feb. ff. fig. fl. fol.
+    fols. Fr. Gen. Gov. Hon. i.e. ill. Inc. incl. Jan. Jr. Jul. Jun. Ltd. M.A.
+    M.D. Mar. Mr. Mrs. Ms. n. n.b. nn. No. Nov. Oct. p. Ph.D. pp. Pres. Prof.
+    pt. q.v. Rep. Rev. s.v. s.vv. saec. sec. Sen. Sep. Sept. Sgt. Sr. St.
+    univ. viz. vol. vs.
+""".split())
+
+# characters that start markdown constructs outside of the supported subset
+UNSUPPORTED_CHARACTERS = set("_`[]<>$^~@{}|#&")
+
+_FENCE = re.compile(r"^(~{3,})\s*$")
+_HEADING = re.compile(r"^### +(\S.*)$")
+_LIST_ITEM = re.compile(r"^( {0,3})(?:(-)|([0-9]{1,9})\.|\(([a-z])\))( {1,4})(\S.*)$")
+# anything else that pandoc might read as the start of a block, including
+# horizontal rules such as "--- --"
+_BLOCK_START = re.compile(r"^ *(?:[-*+](?:\s|$)|[>#|:=~%<]|\(?(?:[0-9]+|[a-zA-Z]|[ivxlcdmIVXLCDM]+|#)[.)](?:\s|$)|(?:- *){3,}$)")
+
+# separates the words of a paragraph, where lines may be wrapped
+SPACE = None
+Inline = Optional[str]
+Block = Tuple
+Item = Tuple[str, List[Block], bool]
+
+
+def _is_blank(line: str) -> bool:
+    return not line.strip(" ")
+
+
+def _parse_blocks(lines: List[str]) -> List[Block]:
+    blocks: List[Block] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if _is_blank(line):
+            i += 1
+            continue
+        fence = _FENCE.match(line)
+        if fence:
+            closing = re.compile(r"^~{%d,}\s*$" % len(fence.group(1)))
+            for j in range(i + 1, len(lines)):
+                if closing.match(lines[j]):
+                    break
+            else:
+                raise UnsupportedMarkdown("unclosed code block")
+            blocks.append(("code", lines[i + 1:j]))
+            i = j + 1
+            continue
+        if _LIST_ITEM.match(line):
+            i = _parse_list(lines, i, blocks)
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            if heading.group(1).rstrip(" ").endswith("#"):
+                raise UnsupportedMarkdown("closed heading")
+            blocks.append(("heading", heading.group(1)))
+            i += 1
+            continue
+        if line.startswith("    ") or _BLOCK_START.match(line):
+            raise UnsupportedMarkdown("unsupported block: %r" % line[:20])
+        if i + 1 < len(lines) and not _is_blank(lines[i + 1]):
+            raise UnsupportedMarkdown("paragraph with several lines")
+        blocks.append(("para", line.lstrip(" ")))
+        i += 1
+    return blocks
+
+
+def _item_kind(match: "re.Match") -> str:
+    if match.group(2):
+        return "bullet"
+    return "decimal" if match.group(3) else "alpha"
+
+
+def _parse_list(lines: List[str], i: int, blocks: List[Block]) -> int:
+    first = _LIST_ITEM.match(lines[i])
+    indent, kind = first.group(1), _item_kind(first)
+    if kind == "decimal":
+        start = int(first.group(3))
+    elif kind == "alpha":
+        start = ord(first.group(4)) - ord("a") + 1
+    else:
+        start = 1
+
+    items: List[Item] = []
+    match = first
+    while True:
+        text = match.group(6)
+        if _BLOCK_START.match(text):
+            raise UnsupportedMarkdown("block in list item")
+        content_column = match.start(6)
+        i += 1
+        blanks = 0
+        while i < len(lines) and _is_blank(lines[i]):
+            blanks += 1
+            i += 1
+        children: List[Block] = []
+        if i < len(lines) and blanks and lines[i].startswith(" " * content_column):
+            # indented blocks after a blank line belong to the item
+            j = i
+            while j < len(lines) and (_is_blank(lines[j]) or lines[j].startswith(" " * content_column)):
+                j += 1
+            children = _parse_blocks([line[content_column:] for line in lines[i:j]])
+            if any(child[0] != "list" for child in children):
+                raise UnsupportedMarkdown("continuation block in list item")
+            # a trailing blank line of the children is not part of their last item
+            blanks = 0
+            while j > i and _is_blank(lines[j - 1]):
+                blanks += 1
+                j -= 1
+            i = j + blanks
+        if not blanks and i < len(lines) and text.endswith("  "):
+            # pandoc drops a line break before the next item together with
+            # its spaces, any other trailing space follows an abbreviation
+            # as a non-breaking space
+            text = text.rstrip(" ")
+        # like pandoc, the text is a paragraph if a blank line follows it
+        items.append((text, children, bool(blanks) or bool(children)))
+
+        if i >= len(lines):
+            break
+        match = _LIST_ITEM.match(lines[i])
+        if match and match.group(1) == indent and _item_kind(match) == kind:
+            continue
+        if not blanks:
+            raise UnsupportedMarkdown("lazy continuation of a list item")
+        break
+
+    # pandoc turns the last paragraph into plain text if it is the only one
+    paragraphs = [item for item in items if item[2]]
+    if len(paragraphs) == 1 and paragraphs[0] is items[-1] and not items[-1][1]:
+        items[-1] = (items[-1][0], items[-1][1], False)
+    if len({item[2] for item in items}) > 1:
+        raise UnsupportedMarkdown("list with tight and loose items")
+    if kind == "alpha" and start + len(items) - 1 > 26:
+        raise UnsupportedMarkdown("lettered list beyond z")
+    blocks.append(("list", kind, start, items))
+    return i
+
+
+class _InlineParser:
+    """
+    Port of the parts of pandoc's markdown inline parser that the supported
+    subset needs, including its backtracking on unclosed quotes and strong
+    emphasis, which decides where curly quotes end up.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.last_str_end = -1
+        self.quote_context: Optional[str] = None
+
+    def parse(self) -> List[Inline]:
+        pos = 0
+        result: List[Inline] = []
+        while pos < len(self.text):
+            inlines, pos = self.inline(pos)
+            result.extend(inlines)
+        return result
+
+    def _until(self, pos: int, end) -> Optional[Tuple[List[Inline], int]]:
+        # pandoc's many1Till inline end
+        if end(pos) is not None:
+            return None
+        result: List[Inline] = []
+        while pos < len(self.text):
+            inlines, pos = self.inline(pos)
+            result.extend(inlines)
+            end_pos = end(pos)
+            if end_pos is not None:
+                return result, end_pos
+        return None
+
+    def _quote_end(self, quote: str, single: bool):
+        def end(pos: int) -> Optional[int]:
+            if pos >= len(self.text) or self.text[pos] != quote:
+                return None
+            # a single quote followed by a letter is an apostrophe
+            if single and self.text[pos + 1:pos + 2].isalnum():
+                return None
+            return pos + 1
+        return end
+
+    def quoted(self, pos: int) -> Tuple[List[Inline], int]:
+        c = self.text[pos]
+        single = c == "'"
+        context = "single" if single else "double"
+        starts = (
+            self.quote_context != context
+            and self.last_str_end != pos
+            and pos + 1 < len(self.text)
+            and self.text[pos + 1] != " "
+        )
+        if not starts:
+            return ["’" if single else "”"], pos + 1
+        outer_context, self.quote_context = self.quote_context, context
+        try:
+            quoted = self._until(pos + 1, self._quote_end(c, single))
+        finally:
+            self.quote_context = outer_context
+        if quoted is None:
+            # unclosed, pandoc keeps an apostrophe or an opening double quote
+            return ["’" if single else "“"], pos + 1
+        contents, pos = quoted
+        # the space before the closing quote is dropped
+        while contents and contents[-1] is SPACE:
+            contents.pop()
+        if single:
+            return ["‘"] + contents + ["’"], pos
+        return ["“"] + contents + ["”"], pos
+
+    def inline(self, pos: int) -> Tuple[List[Inline], int]:
+        text = self.text
+        c = text[pos]
+        if c == " ":
+            while pos < len(text) and text[pos] == " ":
+                pos += 1
+            return [SPACE], pos
+        if c.isalnum() or (c == "." and text[pos + 1:pos + 2] != "."):
+            start = pos
+            while pos < len(text) and (text[pos].isalnum() or (text[pos] == "." and text[pos + 1:pos + 2] != ".")):
+                pos += 1
+            self.last_str_end = pos
+            word = text[start:pos]
+            if word in ABBREVIATIONS and text[pos:pos + 1] == " ":
+                while pos < len(text) and text[pos] == " ":
+                    pos += 1
+                return [word + " "], pos
+            return [word], pos
+        if c == "*":
+            return self.strong(pos)
+        if c == "\\":
+            escaped = text[pos + 1:pos + 2]
+            if not escaped or not (escaped.isascii() and not escaped.isalnum() and escaped.isprintable() and escaped != " "):
+                raise UnsupportedMarkdown("unsupported escape")
+            return [escaped], pos + 2
+        if c in "\"'":
+            return self.quoted(pos)
+        if c == "-":
+            if text.startswith("---", pos):
+                return ["—"], pos + 3
+            if text.startswith("--", pos):
+                return ["–"], pos + 2
+            return ["-"], pos + 1
+        if c == ".":
+            if text.startswith("...", pos):
+                return ["…"], pos + 3
+            return ["."], pos + 1
+        if c in UNSUPPORTED_CHARACTERS:
+            raise UnsupportedMarkdown("unsupported character %r" % c)
+        return [c], pos + 1
+
+    def strong(self, pos: int) -> Tuple[List[Inline], int]:
+        text = self.text
+        if not text.startswith("**", pos) or text.startswith("***", pos):
+            raise UnsupportedMarkdown("emphasis")
+        pos += 2
+        if pos >= len(text) or text[pos] == " ":
+            raise UnsupportedMarkdown("literal asterisks")
+        contents: List[Inline] = []
+        while pos < len(text):
+            if text.startswith("**", pos):
+                if text[pos - 1] == " ":
+                    # pandoc keeps such spaces apart from the ones around the strong element
+                    raise UnsupportedMarkdown("space before closing asterisks")
+                self.last_str_end = pos + 2
+                return contents, pos + 2
+            inlines, pos = self.inline(pos)
+            contents.extend(inlines)
+        # unclosed, pandoc keeps the asterisks
+        return ["**"] + contents, pos
+
+
+def _parse_inlines(text: str) -> List[Inline]:
+    if "*" in re.sub(r"\\.", "", text).replace("**", ""):
+        raise UnsupportedMarkdown("emphasis")
+    inlines = _InlineParser(text).parse()
+    if any(inline is not SPACE and "*" in inline for inline in inlines):
+        raise UnsupportedMarkdown("literal asterisks")
+    return inlines
+
+
+def _width(text: str) -> int:
+    width = 0
+    for c in text:
+        if unicodedata.combining(c):
+            continue
+        width += 2 if unicodedata.east_asian_width(c) in ("W", "F") else 1
+    return width
+
+
+# words that pandoc does not put at the start of a line (unless they end the
+# paragraph), where they would read as a list marker. Within list items any
+# list marker is kept off the line start, elsewhere only the ones that can
+# interrupt a paragraph.
+_PARAGRAPH_MARKER = re.compile(r"^(?:[-+*]|1[.)])$")
+_LIST_MARKER = re.compile(r"^(?:[-+*]|(?:[0-9]+|[a-zA-Z]|[ivxlcdmIVXLCDM]+|#)[.)]|\((?:[0-9]+|[a-zA-Z]|[ivxlcdmIVXLCDM]+|#)\))$")
+
+
+def _words(inlines: List[Inline], in_list: bool) -> List[str]:
+    words = [""]
+    for inline in inlines:
+        if inline is SPACE:
+            if words[-1]:
+                words.append("")
+        else:
+            words[-1] += inline
+    words = [word for word in words if word]
+    marker = _LIST_MARKER if in_list else _PARAGRAPH_MARKER
+    glued: List[str] = []
+    for index, word in enumerate(words):
+        if 0 < index < len(words) - 1 and marker.match(word):
+            glued[-1] += " " + word
+        else:
+            glued.append(word)
+    return glued
+
+
+def _wrap(text: str, width: int, in_list: bool = False) -> List[str]:
+    lines: List[str] = []
+    line, line_width = "", 0
+    for word in _words(_parse_inlines(text), in_list):
+        word_width = _width(word)
+        if line and line_width + 1 + word_width > width:
+            lines.append(line)
+            line, line_width = "", 0
+        if line:
+            line += " " + word
+            line_width += 1 + word_width
+        else:
+            line, line_width = word, word_width
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _marker(kind: str, number: int) -> str:
+    if kind == "bullet":
+        return "- "
+    marker = "%d." % number if kind == "decimal" else "(%s)" % chr(ord("a") + number - 1)
+    return marker + " " * max(1, 4 - len(marker))
+
+
+def _render_blocks(blocks: List[Block], width: int) -> List[str]:
+    lines: List[str] = []
+    for block in blocks:
+        if lines:
+            lines.append("")
+        lines.extend(_render_block(block, width))
+    return lines
+
+
+def _render_block(block: Block, width: int) -> List[str]:
+    if block[0] == "code":
+        return ["    " + line if line.strip(" ") else "" for line in block[1]]
+    if block[0] == "heading":
+        return ["".join(inline if inline is not SPACE else " " for inline in _parse_inlines(block[1]))]
+    if block[0] == "para":
+        return _wrap(block[1], width)
+    kind, start, items = block[1], block[2], block[3]
+    loose = items[0][2]
+    lines: List[str] = []
+    for number, (text, children, _) in enumerate(items, start):
+        marker = _marker(kind, number)
+        hang = len(marker)
+        item_lines = _wrap(text, width - hang, in_list=True)
+        if children:
+            item_lines += [""] + _render_blocks(children, width - hang)
+        if loose and lines:
+            lines.append("")
+        lines.extend(
+            (marker if index == 0 else " " * hang) + line if line else ""
+            for index, line in enumerate(item_lines)
+        )
+    return lines
+
+
+def markdown_to_plain(markdown: str) -> str:
+    """
+    Convert markdown to plain text like `pandoc --from=markdown --to=plain`.
+    Raises UnsupportedMarkdown for documents outside of the supported subset.
+    """
+    if "\t" in markdown or "\r" in markdown:
+        raise UnsupportedMarkdown("tabs or carriage returns")
+    lines = _render_blocks(_parse_blocks(markdown.split("\n")), WIDTH)
+    return "".join(line.rstrip(" ") + "\n" for line in lines)
+
+
+class PlainTextWriter:
+    """
+    Converts markdown to plain text with markdown_to_plain and hands the
+    documents that it does not support to the fallback converter.
+    """
+
+    def __init__(self, fallback: Callable[[str], str]):
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self.converted = 0
+        self.fallbacks = 0
+
+    def convert(self, markdown: str) -> str:
+        try:
+            text = markdown_to_plain(markdown)
+        except UnsupportedMarkdown as e:
+            logger.debug("Converting plain text with pandoc: %s", e)
+            with self._lock:
+                self.fallbacks += 1
+            return self.fallback(markdown)
+        with self._lock:
+            self.converted += 1
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "converted": self.converted,
+            "fallbacks": self.fallbacks,
+        }
+
+
+plain_writer = PlainTextWriter(lambda markdown: converter_pool.convert(markdown, "plain"))
+metrics.register("plain_writer", plain_writer.stats)
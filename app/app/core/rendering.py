@@ -0,0 +1,423 @@
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import datetime
+import functools
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Union
+import uuid as uuid_pkg
+
+from pathvalidate import validate_filename, ValidationError
+from pydantic import BaseModel
+
+from app import models
+from app.core import metrics
+from app.core.artifact_cache import artifact_cache
+from app.core.cache import LRUCache
+from app.core.cancellation import RenderCancelled, check_cancelled
+from app.core.config import settings
+from app.core.fragments import FragmentedTemplate, RenderedDocument, get_fragmented_template
+from app.core.pandoc import converter_pool, pdf_converter_pool
+from app.core.plain import plain_writer
+from app.core.singleflight import SingleFlight
+from app.core.templates import get_template
+
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+
+class MediaType(str, Enum):
+    plain = "text/plain"
+    latex = "text/latex"
+    markdown = "text/markdown"
+    rtf = "text/rtf"
+    pdf = "application/pdf"
+
+# lane of render_lanes that renders each format, lanes from cheap to expensive
+RENDER_LANES = {
+    MediaType.markdown: "fast",
+    MediaType.plain: "fast",
+    MediaType.rtf: "convert",
+    MediaType.latex: "convert",
+    MediaType.pdf: "pdf",
+}
+_LANE_ORDER = ["fast", "convert", "pdf"]
+
+
+def get_render_lane(media_types: Iterable[MediaType]) -> str:
+    """
+    The lane of the most expensive of media_types.
+    """
+    return max((RENDER_LANES[media_type] for media_type in media_types), key=_LANE_ORDER.index, default="fast")
+
+FILE_EXTENSIONS = {
+    MediaType.plain: "txt",
+    MediaType.latex: "latex",
+    MediaType.markdown: "md",
+    MediaType.rtf: "rtf",
+    MediaType.pdf: "pdf",
+}
+
+# pandoc output format for all media types that have to be converted from markdown,
+# plain text is only converted by pandoc if the plain writer does not support the document
+PANDOC_FORMATS = {
+    MediaType.plain: "plain",
+    MediaType.latex: "latex",
+    MediaType.rtf: "rtf",
+}
+
+# media types that pandoc converts from the parsed document instead of the markdown
+AST_FORMATS = {MediaType.latex, MediaType.rtf, MediaType.pdf}
+
+# pandoc json AST of rendered licenses by (license id, git sha), so that the
+# markdown is parsed once for all formats
+ast_cache = LRUCache(maxsize=settings.AST_CACHE_SIZE)
+metrics.register("ast_cache", ast_cache.stats)
+
+# concurrent renders of the same (license id, git sha, media type) share one rendering
+render_flights = SingleFlight()
+metrics.register("render_coalescing", render_flights.stats)
+
+# version of the code that renders and converts licenses, part of their ETags
+# and cache keys, bump it whenever a change to the template context, the
+# fragments, the plain text writer or the conversions changes the documents
+RENDERER_VERSION = "2"
+
+TEMPLATE_FILES = {
+    "ResearchRAIL": "ResearchUseRAIL.jinja",
+    "OpenRAIL": "OpenRAIL-AMS.jinja",
+    "RAIL": "RAIL-AMS.jinja",
+}
+
+
+def get_template_file(license: Union[models.LicenseBase, "RenderContext"]) -> str:
+    if license.license not in TEMPLATE_FILES:
+        raise ValueError("Unknown license type")
+    return TEMPLATE_FILES[license.license]
+
+
+def build_restriction_snapshot(restrictions: Iterable[models.LicenseRestriction]) -> List[List[Any]]:
+    """
+    Group the restriction texts by domain and letter them, as the templates
+    expect them: [[domain, [[letter, text], ...]], ...].
+    A list of pairs is used instead of a mapping, since jsonb does not keep
+    the order of object keys.
+    """
+    restrictions_by_domain: Dict[str, List[str]] = {}
+    for restriction in restrictions:
+        # put additional restriction in correct domain
+        # create if not exists
+        if restriction.domain.name not in restrictions_by_domain:
+            restrictions_by_domain[restriction.domain.name] = []
+        # append restriction
+        restrictions_by_domain[restriction.domain.name].append(restriction.text)
+
+    # create index for each restriction with letters
+    return [
+        [domain, [[chr(97 + index), text] for index, text in enumerate(texts)]]
+        for domain, texts in restrictions_by_domain.items()
+    ]
+
+
+class RenderContext(BaseModel):
+    """
+    Everything rendering needs to know about a license, detached from the
+    database, so that no connection is held while rendering and converting.
+    """
+    id: uuid_pkg.UUID
+    name: str
+    license: str
+    application: bool
+    model: bool
+    sourcecode: bool
+    data: bool
+    timestamp: datetime.datetime
+    git_commit_hash: str
+    template_version_hash: Optional[str]
+    restriction_snapshot: List[List[Any]]
+
+    class Config:
+        allow_mutation = False
+
+    @classmethod
+    def from_license(cls, license: models.License) -> "RenderContext":
+        snapshot = license.restriction_snapshot
+        if snapshot is None:
+            # licenses are created with a snapshot, walking the relationships is
+            # only a fallback for rows that were inserted some other way
+            snapshot = build_restriction_snapshot(license.restrictions)
+        return cls(
+            id=license.id,
+            name=license.name,
+            license=license.license,
+            application=license.application,
+            model=license.model,
+            sourcecode=license.sourcecode,
+            data=license.data,
+            timestamp=license.timestamp,
+            git_commit_hash=license.git_commit_hash,
+            template_version_hash=license.template_version_hash,
+            restriction_snapshot=snapshot,
+        )
+
+
+def get_template_context(license: RenderContext) -> Dict[str, Any]:
+    restrictions = dict(license.restriction_snapshot)
+
+    # construct array of licensed artifacts
+    artifacts = []
+    if license.application:
+        artifacts.append("Application")
+    if license.model:
+        artifacts.append("Model")
+    if license.sourcecode:
+        artifacts.append("Source Code")
+
+    short_artifact_name = "".join([artifact[0] for artifact in artifacts])
+
+    return dict(
+        ARTIFACTS=artifacts,
+        SHORT_ARTIFACT_NAME=short_artifact_name,
+        LICENSE_NAME=license.name,
+        RESTRICTIONS=restrictions,
+        LICENSE_TIMESTAMP=license.timestamp,
+        LICENSE_ID=license.id,
+        LICENSE_TEMPLATE_VERSION=license.git_commit_hash
+    )
+
+
+def _template_content_hash(license: RenderContext, git_sha: str) -> Optional[str]:
+    # licenses reference the registered template source of their own version
+    return license.template_version_hash if git_sha == license.git_commit_hash else None
+
+
+def get_license_template(license: RenderContext, git_sha: str) -> "Template":
+    return get_template(get_template_file(license), git_sha, _template_content_hash(license, git_sha))
+
+
+def get_license_fragments(license: RenderContext, git_sha: str) -> FragmentedTemplate:
+    return get_fragmented_template(get_template_file(license), git_sha, _template_content_hash(license, git_sha))
+
+
+def render_document(license: RenderContext, git_sha: str) -> RenderedDocument:
+    """
+    Render only the dynamic fragments of the license template.
+    """
+    return get_license_fragments(license, git_sha).render(get_template_context(license))
+
+
+def render_markdown(license: RenderContext, git_sha: str) -> str:
+    return render_document(license, git_sha).markdown
+
+
+def generate_markdown(license: RenderContext, git_sha: str) -> Iterator[str]:
+    """
+    Like render_markdown, but yields the document in fragments while it renders.
+    The license is read eagerly, so the iterator does not touch the database.
+    """
+    template = get_license_template(license, git_sha)
+    return template.generate(**get_template_context(license))
+
+
+def get_filename(license: Union[models.License, RenderContext]) -> str:
+    """
+    Download filename of the license without extension.
+    """
+    try:
+        filename = license.name + "-" + license.license
+        # check if filename can be encodable and a proper filename for all platforms
+        filename.encode("latin1")
+        validate_filename(filename)
+    except (UnicodeEncodeError, ValidationError):
+        filename = license.license
+    except Exception as e:
+        print(e)
+        raise ValueError("The license name could not be encoded correctly. Please check the license name for special characters and contact the maintainers.")
+    return filename
+
+
+@functools.lru_cache()
+def _pandoc_version() -> str:
+    import pypandoc
+
+    return pypandoc.get_pandoc_version()
+
+
+def get_content_version(license: RenderContext, git_sha: str, media_type: MediaType) -> str:
+    """
+    Digest of everything the license document depends on, computed without
+    rendering it: the license row and its restrictions, the template version
+    and the media type, and the code and pandoc version that convert it.
+    """
+    parts = [
+        license.id, git_sha, media_type.value, license.name, license.license,
+        license.application, license.model, license.sourcecode, license.data,
+        license.timestamp.isoformat(), license.git_commit_hash,
+        json.dumps(license.restriction_snapshot), RENDERER_VERSION, _pandoc_version(),
+    ]
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def get_etag(license: RenderContext, git_sha: str, media_type: MediaType) -> str:
+    """
+    Strong ETag of the license document.
+    """
+    return f'"{get_content_version(license, git_sha, media_type)[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluate an If-None-Match header, which uses the weak comparison.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def parse_markdown(markdown: str) -> str:
+    """
+    Parse markdown into pandoc's json AST.
+    """
+    return converter_pool.convert(markdown, "json")
+
+
+def convert(markdown: Optional[str], media_type: MediaType, ast: Optional[str] = None) -> bytes:
+    """
+    Convert a rendered license to media_type. The formats in AST_FORMATS are
+    converted from the parsed document if ast is given, markdown is only
+    needed for the other formats then.
+    """
+    if ast is not None and media_type in AST_FORMATS:
+        text, from_format = ast, "json"
+    else:
+        text, from_format = markdown, "markdown"
+    if media_type == MediaType.markdown:
+        return markdown.encode("utf-8")
+    if media_type == MediaType.pdf:
+        # read from pandoc's stdout, the pdf never touches the disk on our side
+        return pdf_converter_pool.convert_binary(text, "pdf", from_format=from_format)
+    if media_type == MediaType.plain:
+        return plain_writer.convert(markdown).encode("utf-8")
+    return converter_pool.convert(text, PANDOC_FORMATS[media_type], from_format=from_format).encode("utf-8")
+
+
+def _assembles(document: RenderedDocument, media_type: MediaType) -> bool:
+    return media_type in PANDOC_FORMATS and document.assembles(PANDOC_FORMATS[media_type])
+
+
+def convert_document(document: RenderedDocument, media_type: MediaType, ast: Optional[str] = None) -> bytes:
+    """
+    Convert a rendered license to media_type, by joining its converted
+    fragments where the format allows it.
+    """
+    if media_type == MediaType.markdown:
+        return document.encode()
+    if _assembles(document, media_type):
+        return document.convert(PANDOC_FORMATS[media_type], converter_pool.convert).encode("utf-8")
+    return convert(document.markdown, media_type, ast)
+
+
+def _render_missing(license: RenderContext, git_sha: str, missing: List[MediaType], versions: Dict[MediaType, str]) -> Dict[MediaType, bytes]:
+    check_cancelled()
+    document = render_document(license, git_sha)
+    # the local working copy can change, so only artifacts of a pinned commit are cached
+    cacheable = git_sha != "head"
+    ast = None
+    if any(media_type in AST_FORMATS and not _assembles(document, media_type) for media_type in missing):
+        # keyed by the markdown, so that a changed license is parsed again in every process
+        ast_key = (license.id, git_sha, hashlib.sha256(document.encode()).hexdigest())
+        if cacheable:
+            ast = ast_cache.get(ast_key)
+        if ast is None:
+            check_cancelled()
+            ast = parse_markdown(document.markdown)
+            if cacheable:
+                ast_cache.put(ast_key, ast)
+    check_cancelled()
+    if len(missing) == 1:
+        artifacts = {missing[0]: convert_document(document, missing[0], ast)}
+    else:
+        # each conversion runs in the cancel scope of the render
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            futures = {
+                media_type: executor.submit(contextvars.copy_context().run, convert_document, document, media_type, ast)
+                for media_type in missing
+            }
+        artifacts = {media_type: future.result() for media_type, future in futures.items()}
+    if cacheable:
+        for media_type in missing:
+            artifact_cache.put(license.id, git_sha, media_type.value, versions[media_type], artifacts[media_type])
+    return artifacts
+
+
+def render_artifacts(license: RenderContext, git_sha: str, media_types: Iterable[MediaType]) -> Dict[MediaType, bytes]:
+    """
+    Return the license document at template version git_sha in all media_types,
+    served from the artifact cache where possible.
+
+    Only the dynamic fragments of the template are rendered and converted,
+    the missing formats are converted in parallel. Formats that cannot be
+    joined from fragments are converted from the parsed document, which is
+    cached, so that further formats of the same license skip the parsing.
+
+    Formats that are already being rendered by a concurrent call are not
+    rendered again, the result of that call is awaited instead.
+    """
+    media_types = list(dict.fromkeys(media_types))
+    versions = {media_type: get_content_version(license, git_sha, media_type) for media_type in media_types}
+    artifacts = {}
+    if git_sha != "head":
+        for media_type in media_types:
+            artifact = artifact_cache.get(license.id, git_sha, media_type.value, versions[media_type])
+            if artifact is not None:
+                artifacts[media_type] = artifact
+
+    missing = [media_type for media_type in media_types if media_type not in artifacts]
+    if missing:
+        flights = {}
+        owned = []
+        for media_type in missing:
+            flights[media_type], leader = render_flights.begin((license.id, git_sha, versions[media_type]))
+            if leader:
+                owned.append(media_type)
+        if owned:
+            try:
+                artifacts.update(_render_missing(license, git_sha, owned, versions))
+            except BaseException as e:
+                for media_type in owned:
+                    render_flights.finish((license.id, git_sha, versions[media_type]), error=e)
+                raise
+            for media_type in owned:
+                render_flights.finish((license.id, git_sha, versions[media_type]), result=artifacts[media_type])
+        # the own formats are finished first, so that concurrent calls never wait on each other
+        for media_type in missing:
+            if media_type not in owned:
+                try:
+                    artifacts[media_type] = flights[media_type].wait()
+                except RenderCancelled:
+                    # the client of that render went away, not the client of this one
+                    check_cancelled()
+                    artifacts[media_type] = render_artifact(license, git_sha, media_type)
+    return {media_type: artifacts[media_type] for media_type in media_types}
+
+
+def invalidate_license(license_id: Any) -> None:
+    """
+    Drop the cached artifacts and parsed documents of a changed or deleted
+    license. They are never served once the license changed, as they are
+    cached by content, this only frees their space in this process.
+    """
+    artifact_cache.invalidate(license_id)
+    ast_cache.invalidate(lambda key: key[0] == license_id)
+
+
+def render_artifact(license: RenderContext, git_sha: str, media_type: MediaType) -> bytes:
+    """
+    Return the license document at template version git_sha in media_type,
+    served from the artifact cache where possible.
+    """
+    return render_artifacts(license, git_sha, [media_type])[media_type]
@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.core.cancellation import check_cancelled, on_cancel
+
+
+class Flight:
+    """
+    A computation in progress, its result or exception is shared by all
+    callers that asked for the same key in the meantime.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._condition:
+            self.result = result
+            self.error = error
+            self._done = True
+            self._condition.notify_all()
+
+    def _wake(self) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self) -> Any:
+        """
+        Wait for the result, raises RenderCancelled as soon as the render of
+        the caller is cancelled, so that it does not hold its worker until
+        the computation is done.
+        """
+        with on_cancel(self._wake), self._condition:
+            while not self._done:
+                check_cancelled()
+                self._condition.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key: the first caller
+    computes the value, callers that arrive before it is done wait for that
+    computation instead of starting their own.
+
+    Nothing is kept once a computation is done, caching the result is up to
+    the caller.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key: Hashable) -> Tuple[Flight, bool]:
+        """
+        Join the flight of key, or start one. Returns the flight and whether
+        the caller started it, that caller then has to finish it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.leaders += 1
+            return flight, True
+
+    def finish(self, key: Hashable, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            flight = self._flights.pop(key)
+        flight.resolve(result, error)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,59 @@
+from typing import Iterable, Iterator, List, Tuple
+import zipfile
+
+
+def iter_chunks(fragments: Iterable[str], chunk_size: int) -> Iterator[bytes]:
+    """
+    Join small text fragments, e.g. from jinja's Template.generate(), into
+    utf-8 encoded blocks of at least chunk_size characters.
+
+    Every yielded block is one ASGI send call (and one pass through the gzip
+    middleware), so documents smaller than chunk_size are sent in one piece.
+    """
+    buffer = []
+    size = 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        size += len(fragment)
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+class _ChunkWriter:
+    """
+    Write-only file object that collects whatever zipfile writes to it.
+    It has no tell() or seek(), which makes zipfile write a streamable archive.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(files: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """
+    Build a zip archive of (name, content) pairs and yield it entry by entry,
+    so that at most one compressed entry is held in memory at a time.
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            yield writer.pop()
+    # the central directory is written when the archive is closed
+    yield writer.pop()
@@ -0,0 +1,225 @@
+import datetime
+import functools
+import os
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Tuple
+
+from app import crud
+from app.core import metrics
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.db.session import Session
+
+# dulwich and jinja are only imported once templates are actually read, which
+# keeps them out of the import time of every worker
+if TYPE_CHECKING:
+    from dulwich.repo import Repo
+    from jinja2 import Template
+
+# location of the templates in the working copy of the container
+TEMPLATE_DIR = "/app/app/app/templates/"
+# location of the templates relative to the repository root
+TEMPLATE_REPO_DIR = "app/app/templates/"
+
+
+class TemplateVersionNotFound(KeyError):
+    """The requested commit does not exist or has no such template."""
+
+
+template_cache = LRUCache(maxsize=settings.TEMPLATE_CACHE_SIZE)
+metrics.register("template_cache", template_cache.stats)
+
+
+@functools.lru_cache()
+def get_repo() -> Optional["Repo"]:
+    """
+    The git repository of the app, discovered on first use.
+    None without a checkout, templates are then served from the template
+    registry in the database.
+    """
+    from dulwich.errors import NotGitRepository
+    from dulwich.repo import Repo
+
+    try:
+        return Repo.discover()
+    except NotGitRepository:
+        return None
+
+
+class TemplateIndex:
+    """
+    In-memory map from commit to template file to template source.
+
+    The history is walked once, afterwards only commits that were added since
+    the last walk are indexed. Most commits do not touch the templates, so
+    commits map to the sha of their template directory, which maps to the
+    blob shas of the templates, which map to the (deduplicated) sources.
+    """
+
+    def __init__(self, get_repo: Callable[[], Optional["Repo"]]):
+        self._get_repo = get_repo
+        self.head: Optional[bytes] = None
+        self._commits: Dict[bytes, bytes] = {}
+        self._commit_times: Dict[bytes, int] = {}
+        self._trees: Dict[bytes, Dict[str, bytes]] = {}
+        self._blobs: Dict[bytes, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def repo(self) -> Optional["Repo"]:
+        return self._get_repo()
+
+    def refresh(self) -> None:
+        """
+        Index all commits that are reachable from HEAD and not indexed yet.
+        """
+        repo = self.repo
+        if repo is None:
+            return
+        with self._lock:
+            head = repo.head()
+            if head == self.head:
+                return
+            exclude = [self.head] if self.head else None
+            for entry in repo.get_walker(include=[head], exclude=exclude):
+                self._add_commit(entry.commit)
+            self.head = head
+
+    def _add_commit(self, commit) -> None:
+        from dulwich.object_store import tree_lookup_path
+
+        try:
+            mode, tree_sha = tree_lookup_path(self.repo.get_object, commit.tree, TEMPLATE_REPO_DIR.rstrip("/").encode("utf-8"))
+        except KeyError:
+            # the commit predates the templates
+            return
+        self._commits[commit.id] = tree_sha
+        self._commit_times[commit.id] = commit.commit_time
+        if tree_sha in self._trees:
+            return
+        files = {}
+        for entry in self.repo[tree_sha].iteritems():
+            if not entry.path.endswith(b".jinja"):
+                continue
+            files[entry.path.decode("utf-8")] = entry.sha
+            if entry.sha not in self._blobs:
+                self._blobs[entry.sha] = self.repo[entry.sha].data.decode("utf-8")
+        self._trees[tree_sha] = files
+
+    def lookup(self, template_file: str, git_sha: str) -> Optional[str]:
+        tree_sha = self._commits.get(git_sha.encode("ascii"))
+        if tree_sha is None:
+            return None
+        blob_sha = self._trees[tree_sha].get(template_file)
+        if blob_sha is None:
+            return None
+        return self._blobs[blob_sha]
+
+    def revisions(self) -> Iterator[Tuple[str, str, str, datetime.datetime]]:
+        """
+        Yield (git_sha, template_file, source, committed_at) of all indexed commits.
+        """
+        for commit_sha, tree_sha in list(self._commits.items()):
+            committed_at = datetime.datetime.fromtimestamp(self._commit_times[commit_sha], datetime.timezone.utc)
+            for template_file, blob_sha in self._trees[tree_sha].items():
+                yield commit_sha.decode("ascii"), template_file, self._blobs[blob_sha], committed_at
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "commits": len(self._commits),
+            "trees": len(self._trees),
+            "blobs": len(self._blobs),
+            "blob_bytes": sum(len(blob) for blob in self._blobs.values()),
+        }
+
+
+template_index = TemplateIndex(get_repo)
+metrics.register("template_index", template_index.stats)
+
+
+@functools.lru_cache()
+def current_template_sha() -> str:
+    """
+    Template version of newly created licenses: TEMPLATE_GIT_SHA if it is
+    set, else HEAD of the repository, else the newest registered commit.
+    """
+    if settings.TEMPLATE_GIT_SHA:
+        return settings.TEMPLATE_GIT_SHA
+    repo = get_repo()
+    if repo is not None:
+        return repo.head().decode("ascii")
+    with Session() as db:
+        revision = crud.template_version.get_latest_revision(db)
+    if revision is None:
+        raise RuntimeError("No template version is known, run the template sync first")
+    return revision.git_sha
+
+
+def load_registered_source(template_file: str, git_sha: str, content_hash: Optional[str] = None) -> Optional[str]:
+    """
+    Read the template source from the template registry, by its content hash
+    if it is known, else by commit.
+    """
+    with Session() as db:
+        if content_hash:
+            version = crud.template_version.get(db, content_hash=content_hash)
+        else:
+            version = crud.template_version.get_source(db, git_sha=git_sha, template_file=template_file)
+    return version.source if version else None
+
+
+def load_template_source(template_file: str, git_sha: str, content_hash: Optional[str] = None) -> str:
+    """
+    Read the template source of template_file as it was at commit git_sha.
+    'head' reads the template from the local working copy instead.
+
+    The template registry is asked first, git is only read for commits that
+    have not been synced yet.
+    """
+    if git_sha == "head":
+        with open(TEMPLATE_DIR + template_file, "r") as f:
+            return f.read()
+    source = load_registered_source(template_file, git_sha, content_hash)
+    if source is not None:
+        return source
+    repo = get_repo()
+    if repo is None:
+        raise TemplateVersionNotFound("Template %s is not registered for commit %s" % (template_file, git_sha))
+    source = template_index.lookup(template_file, git_sha)
+    if source is None:
+        # HEAD might have moved since the index was built
+        template_index.refresh()
+        source = template_index.lookup(template_file, git_sha)
+    if source is not None:
+        return source
+    # commits that are not reachable from HEAD are read from git directly
+    from dulwich.object_store import tree_lookup_path
+
+    # dulwich expects bytes instead of str
+    path = bytes(TEMPLATE_REPO_DIR + template_file, "utf-8")
+    try:
+        commit = repo.get_object(git_sha.encode("ascii"))
+        mode, sha = tree_lookup_path(repo.get_object, commit.tree, path)
+    except KeyError:
+        raise TemplateVersionNotFound("Template %s does not exist at commit %s" % (template_file, git_sha))
+    return repo[sha].data.decode("utf-8")
+
+
+def get_template(template_file: str, git_sha: str, content_hash: Optional[str] = None) -> "Template":
+    """
+    Return the compiled jinja template of template_file at commit git_sha.
+    content_hash is the registered source of that pair, if the caller knows it.
+
+    A (template, commit) pair never changes, so compiled templates are cached
+    process wide. The local working copy can change during development, hence
+    its modification time is part of the cache key.
+    """
+    from jinja2 import Template
+
+    if git_sha == "head":
+        key = (template_file, git_sha, os.stat(TEMPLATE_DIR + template_file).st_mtime_ns)
+    else:
+        key = (template_file, git_sha)
+    return template_cache.get_or_create(
+        key, lambda: Template(load_template_source(template_file, git_sha, content_hash))
+    )
@@ -3,6 +3,8 @@ from .crud_license import license
 from .crud_license_source import license_source
 from .crud_license_domain import license_domain
 from .crud_license_restriction import license_restriction
+from .crud_render_job import render_job
+from .crud_template_version import template_version
 
 # For a new basic set of CRUD operations you could just do
 
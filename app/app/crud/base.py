@@ -1,8 +1,13 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+import base64
+import json
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel
+from pydantic import BaseModel, parse_obj_as
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
 
 
 ModelType = TypeVar("ModelType")
@@ -11,7 +16,7 @@ UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
-    def __init__(self, model: Type[ModelType]):
+    def __init__(self, model: Type[ModelType], sort_keys: Sequence[str] = ("id",)):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
 
@@ -19,16 +24,84 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
         * `model`: A SQLAlchemy model class
         * `schema`: A Pydantic model (schema) class
+        * `sort_keys`: Fields that order lists of the model, ending in a unique one
         """
         self.model = model
+        self.sort_keys = tuple(sort_keys)
 
     def get(self, db: Session, id: Any) -> Optional[ModelType]:
         return db.query(self.model).filter(self.model.id == id).first()
 
+    async def aget(self, db: AsyncSession, id: Any, options: Sequence[Any] = ()) -> Optional[ModelType]:
+        """
+        Like get, on an async session. Relationships that are used later
+        have to be loaded with options, they cannot be loaded lazily.
+        """
+        return await db.get(self.model, id, options=options)
+
+    def _sort_columns(self) -> List[Any]:
+        return [getattr(self.model, key) for key in self.sort_keys]
+
+    def _select_multi(self, skip: int, limit: int, filter: Optional[Dict[str, Any]]) -> Select:
+        return select(self.model).filter_by(**filter).order_by(*self._sort_columns()).offset(skip).limit(limit)
+
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100, filter: Optional[Dict[str, Any]] = {}
     ) -> List[ModelType]:
-        return db.query(self.model).filter_by(**filter).offset(skip).limit(limit).all()
+        return db.execute(self._select_multi(skip, limit, filter)).scalars().all()
+
+    async def aget_multi(
+        self, db: AsyncSession, *, skip: int = 0, limit: int = 100, filter: Optional[Dict[str, Any]] = {}
+    ) -> List[ModelType]:
+        return (await db.execute(self._select_multi(skip, limit, filter))).scalars().all()
+
+    def _select_page(self, cursor: Optional[str], limit: int, filter: Optional[Dict[str, Any]]) -> Select:
+        columns = self._sort_columns()
+        query = select(self.model).filter_by(**filter)
+        if cursor is not None:
+            values = tuple_(*self.decode_cursor(cursor), types=[column.type for column in columns])
+            query = query.filter(tuple_(*columns) > values)
+        # one row more tells whether there is a next page
+        return query.order_by(*columns).limit(limit + 1)
+
+    def _page(self, rows: List[ModelType], limit: int) -> Tuple[List[ModelType], Optional[str]]:
+        if limit > 0 and len(rows) > limit:
+            return rows[:limit], self.encode_cursor(rows[limit - 1])
+        return rows[:limit], None
+
+    def get_page(
+        self, db: Session, *, cursor: Optional[str] = None, limit: int = 100, filter: Optional[Dict[str, Any]] = {}
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        Keyset pagination: up to limit rows after cursor in the order of
+        sort_keys, and the cursor of the next page, None on the last page.
+        Unlike skip, the cost of a page does not grow with its depth.
+        """
+        return self._page(db.execute(self._select_page(cursor, limit, filter)).scalars().all(), limit)
+
+    async def aget_page(
+        self, db: AsyncSession, *, cursor: Optional[str] = None, limit: int = 100, filter: Optional[Dict[str, Any]] = {}
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        return self._page((await db.execute(self._select_page(cursor, limit, filter))).scalars().all(), limit)
+
+    def encode_cursor(self, obj: ModelType) -> str:
+        """
+        Opaque cursor that points right after obj.
+        """
+        values = jsonable_encoder([getattr(obj, key) for key in self.sort_keys])
+        return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor: str) -> List[Any]:
+        """
+        The sort key values of cursor, raises ValueError for invalid cursors.
+        """
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(self.sort_keys):
+            raise ValueError("invalid cursor")
+        return [
+            parse_obj_as(self.model.__fields__[key].outer_type_, value)
+            for key, value in zip(self.sort_keys, values)
+        ]
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
@@ -1,8 +1,43 @@
-from typing import Optional
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.db.session import Session
 from .base import CRUDBase
-from app.models import License, LicenseCreate
-    
-license = CRUDBase[License, LicenseCreate, LicenseCreate](License)
+from app.models import License, LicenseCreate, LicenseRestriction
+from app.models.link_tables import License_LicenseRestriction_Link
+
+
+class CRUDLicense(CRUDBase[License, LicenseCreate, LicenseCreate]):
+    def create_with_restrictions(
+        self, db: Session, *, obj_in: LicenseCreate, restrictions: Sequence[LicenseRestriction], **values: Any
+    ) -> License:
+        """
+        Insert a license with further column values and its links to
+        restrictions in one transaction, with one statement each, however
+        many restrictions there are.
+
+        The license and the restrictions are detached and stay loaded, so
+        that returning them needs no further queries.
+        """
+        db_obj = License(**obj_in.dict(exclude={"restriction_ids"}), **values)
+        db.add(db_obj)
+        db.flush()
+        if restrictions:
+            db.execute(
+                insert(License_LicenseRestriction_Link).values(
+                    [{"license_id": db_obj.id, "source_id": restriction.id} for restriction in restrictions]
+                )
+            )
+        set_committed_value(db_obj, "restrictions", list(restrictions))
+        # the commit would expire them, other objects of the session are left alone
+        for obj in [db_obj, *restrictions, *(restriction.domain for restriction in restrictions)]:
+            if obj in db:
+                db.expunge(obj)
+        db.commit()
+        return db_obj
+
 
+# licenses are listed in the order they were created
+license = CRUDLicense(License, sort_keys=("timestamp", "id"))
@@ -1,8 +1,24 @@
-from typing import Optional
+from typing import List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 from app.db.session import Session
 from .base import CRUDBase
 from app.models import LicenseRestriction, LicenseRestrictionBase
-    
-license_restriction = CRUDBase[LicenseRestriction, LicenseRestrictionBase, LicenseRestrictionBase](LicenseRestriction)
 
+
+class CRUDLicenseRestriction(CRUDBase[LicenseRestriction, LicenseRestrictionBase, LicenseRestrictionBase]):
+    def get_approved_by_ids(self, db: Session, *, ids: Sequence[int]) -> List[LicenseRestriction]:
+        """
+        The approved restrictions among ids, with their domains, in a single query.
+        """
+        query = (
+            select(LicenseRestriction)
+            .options(joinedload(LicenseRestriction.domain))
+            .where(LicenseRestriction.id.in_(ids), LicenseRestriction.approved.is_(True))
+        )
+        return db.execute(query).scalars().all()
+
+
+license_restriction = CRUDLicenseRestriction(LicenseRestriction)
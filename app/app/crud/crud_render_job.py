@@ -0,0 +1,71 @@
+import datetime
+from typing import List, Optional
+import uuid as uuid_pkg
+
+from sqlalchemy.orm import Session
+
+from .base import CRUDBase
+from app.models import RenderJob, RenderJobCreate
+
+
+class CRUDRenderJob(CRUDBase[RenderJob, RenderJobCreate, RenderJobCreate]):
+    def claim(self, db: Session, *, id: uuid_pkg.UUID, max_attempts: int) -> Optional[RenderJob]:
+        """
+        Mark the pending job with id "id" as running.
+        Returns None if the job is gone, has no attempts left or another
+        worker has claimed it first.
+        """
+        job = (
+            db.query(RenderJob)
+            .filter(RenderJob.id == id, RenderJob.status == "pending", RenderJob.attempts < max_attempts)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if not job:
+            db.rollback()
+            return None
+        job.status = "running"
+        job.attempts += 1
+        job.updated_at = datetime.datetime.now(datetime.timezone.utc)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def get_pending_ids(self, db: Session, *, limit: int = 100) -> List[uuid_pkg.UUID]:
+        rows = (
+            db.query(RenderJob.id)
+            .filter(RenderJob.status == "pending")
+            .order_by(RenderJob.created_at)
+            .limit(limit)
+            .all()
+        )
+        return [row.id for row in rows]
+
+    def requeue_stale(self, db: Session, *, older_than: datetime.datetime, max_attempts: int) -> int:
+        """
+        Put running jobs back into the queue whose worker did not report back
+        in time, e.g. because the process was restarted. Jobs without attempts
+        left fail instead, so that a job that kills its worker is not retried
+        forever. Returns the number of jobs put back into the queue.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        stale = db.query(RenderJob).filter(RenderJob.status == "running", RenderJob.updated_at < older_than)
+        stale.filter(RenderJob.attempts >= max_attempts).update(
+            {"status": "failed", "error": "The worker did not report back in time", "updated_at": now, "finished_at": now},
+            synchronize_session=False,
+        )
+        count = stale.filter(RenderJob.attempts < max_attempts).update({"status": "pending"}, synchronize_session=False)
+        db.commit()
+        return count
+
+    def remove_expired(self, db: Session, *, older_than: datetime.datetime) -> int:
+        count = (
+            db.query(RenderJob)
+            .filter(RenderJob.status.in_(["finished", "failed"]), RenderJob.finished_at < older_than)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return count
+
+
+render_job = CRUDRenderJob(RenderJob)
@@ -0,0 +1,86 @@
+import datetime
+import hashlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import License, TemplateRevision, TemplateVersion
+
+
+def content_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class CRUDTemplateVersion:
+    """
+    Registry of template sources, so that templates can be read without a git
+    checkout. Sources are stored once per content, revisions map a
+    (commit, template file) pair to their source.
+    """
+
+    def get(self, db: Session, *, content_hash: str) -> Optional[TemplateVersion]:
+        return db.get(TemplateVersion, content_hash)
+
+    def get_revision(self, db: Session, *, git_sha: str, template_file: str) -> Optional[TemplateRevision]:
+        return db.get(TemplateRevision, (git_sha, template_file))
+
+    def get_source(self, db: Session, *, git_sha: str, template_file: str) -> Optional[TemplateVersion]:
+        return (
+            db.query(TemplateVersion)
+            .join(TemplateRevision, TemplateRevision.content_hash == TemplateVersion.content_hash)
+            .filter(TemplateRevision.git_sha == git_sha, TemplateRevision.template_file == template_file)
+            .first()
+        )
+
+    def get_latest_revision(self, db: Session) -> Optional[TemplateRevision]:
+        return db.query(TemplateRevision).order_by(TemplateRevision.committed_at.desc()).first()
+
+    def sync(self, db: Session, *, revisions: Iterable[Tuple[str, str, str, datetime.datetime]]) -> Tuple[int, int]:
+        """
+        Add (git_sha, template_file, source, committed_at) revisions that are
+        not registered yet.
+        Returns the number of added versions and revisions.
+        """
+        known_versions = {row.content_hash for row in db.query(TemplateVersion.content_hash)}
+        known_revisions = {(row.git_sha, row.template_file) for row in db.query(TemplateRevision.git_sha, TemplateRevision.template_file)}
+        added_versions = added_revisions = 0
+        for git_sha, template_file, source, committed_at in revisions:
+            if (git_sha, template_file) in known_revisions:
+                continue
+            hash = content_hash(source)
+            if hash not in known_versions:
+                db.add(TemplateVersion(content_hash=hash, source=source))
+                known_versions.add(hash)
+                added_versions += 1
+            db.add(TemplateRevision(git_sha=git_sha, template_file=template_file, content_hash=hash, committed_at=committed_at))
+            known_revisions.add((git_sha, template_file))
+            added_revisions += 1
+        db.commit()
+        return added_versions, added_revisions
+
+    def link_licenses(self, db: Session, *, template_files: Dict[str, str]) -> int:
+        """
+        Reference the template version of licenses that were created before
+        their commit was registered. template_files maps license types to
+        their template file.
+        """
+        count = 0
+        for license_type, template_file in template_files.items():
+            revision = (
+                db.query(TemplateRevision.content_hash)
+                .filter(TemplateRevision.git_sha == License.git_commit_hash, TemplateRevision.template_file == template_file)
+            )
+            count += (
+                db.query(License)
+                .filter(
+                    License.template_version_hash.is_(None),
+                    License.license == license_type,
+                    revision.exists(),
+                )
+                .update({License.template_version_hash: revision.scalar_subquery()}, synchronize_session=False)
+            )
+        db.commit()
+        return count
+
+
+template_version = CRUDTemplateVersion()
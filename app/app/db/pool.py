@@ -0,0 +1,162 @@
+"""
+Connection pools that report how long requests wait for a connection.
+
+SQLAlchemy has no event before a checkout, so the wait is timed by the pool
+classes below, everything else is recorded by pool event listeners.
+
+How long connections are held is recorded per route, the route is taken
+from the request that RequestScopeMiddleware set for the current context.
+"""
+import contextvars
+import threading
+import time
+from typing import Any, Dict, MutableMapping, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core import metrics
+
+# ASGI scope of the request being served, the route is only added to it once
+# the request has been routed
+request_scope: "contextvars.ContextVar[Optional[MutableMapping[str, Any]]]" = contextvars.ContextVar("request_scope", default=None)
+
+
+class RequestScopeMiddleware:
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: MutableMapping[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
+
+
+def _route_name(scope: Optional[MutableMapping[str, Any]]) -> str:
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return "%s %s" % (scope["method"], route.path if route is not None else "unmatched")
+
+
+class PoolMetrics:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+        self.connects = 0
+        self.invalidations = 0
+        self.pre_ping_failures = 0
+        self.hold_seconds: Dict[str, Dict[str, Any]] = {}
+
+    def checked_out(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds_total += seconds
+            self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+
+    def timed_out(self) -> None:
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def on_connect(self, dbapi_connection: Any, connection_record: Any) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        connection_record.info["checked_out"] = (request_scope.get(), time.perf_counter())
+
+    def on_checkin(self, dbapi_connection: Any, connection_record: Any) -> None:
+        checked_out = connection_record.info.pop("checked_out", None)
+        if checked_out is None:
+            return
+        scope, start = checked_out
+        seconds = time.perf_counter() - start
+        route = _route_name(scope)
+        with self._lock:
+            hold = self.hold_seconds.get(route)
+            if hold is None:
+                hold = self.hold_seconds[route] = {"count": 0, "total": 0.0, "max": 0.0}
+            hold["count"] += 1
+            hold["total"] += seconds
+            hold["max"] = max(hold["max"], seconds)
+
+    def on_invalidate(self, dbapi_connection: Any, connection_record: Any, exception: Optional[BaseException]) -> None:
+        with self._lock:
+            self.invalidations += 1
+            # raised by the checkout when the pre-ping found a dead connection
+            if isinstance(exception, exc.InvalidatePoolError):
+                self.pre_ping_failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        # the pool is replaced when the engine is disposed
+        pool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            # connections beyond size, the pool counts negative until it is full
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_seconds_total": self.checkout_seconds_total,
+            "checkout_seconds_max": self.checkout_seconds_max,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "pre_ping_failures": self.pre_ping_failures,
+            # how long connections were held by route, "background" for jobs
+            "hold_seconds": {route: dict(hold) for route, hold in self.hold_seconds.items()},
+        }
+
+
+class _TimedCheckout:
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()  # type: ignore[misc]
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.timed_out()
+            raise
+        if self.metrics is not None:
+            self.metrics.checked_out(time.perf_counter() - start)
+        return connection
+
+    def recreate(self) -> Any:
+        pool = super().recreate()  # type: ignore[misc]
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(engine: Engine, name: str) -> PoolMetrics:
+    """
+    Record the pool of engine (the sync_engine of async engines), which has
+    to be created with one of the instrumented pool classes, as metric name.
+    """
+    pool_metrics = PoolMetrics(engine)
+    engine.pool.metrics = pool_metrics
+    event.listen(engine, "connect", pool_metrics.on_connect)
+    event.listen(engine, "checkout", pool_metrics.on_checkout)
+    event.listen(engine, "checkin", pool_metrics.on_checkin)
+    event.listen(engine, "invalidate", pool_metrics.on_invalidate)
+    metrics.register(name, pool_metrics.stats)
+    return pool_metrics
@@ -1,10 +1,27 @@
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Field, SQLModel, create_engine
 from sqlmodel import Session as SQLModelSession
-from contextlib import contextmanager
+from sqlmodel.ext.asyncio.session import AsyncSession as SQLModelAsyncSession
+from contextlib import asynccontextmanager, contextmanager
 
 from app.core.config import settings
+from app.db.pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool, instrument
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+pool_settings = dict(
+    pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, poolclass=InstrumentedQueuePool, **pool_settings)
+instrument(engine, "db_pool")
+# for the hot read paths of async routes, Alembic, init_db and the tests use engine
+async_engine = create_async_engine(
+    settings.SQLALCHEMY_ASYNC_DATABASE_URI, poolclass=InstrumentedAsyncAdaptedQueuePool, **pool_settings
+)
+instrument(async_engine.sync_engine, "db_async_pool")
 
 @contextmanager
 def Session():
@@ -12,4 +29,14 @@ def Session():
     try:
         yield session
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+@asynccontextmanager
+async def AsyncSession():
+    # objects stay usable after a commit, they cannot be refreshed lazily
+    session = SQLModelAsyncSession(async_engine, expire_on_commit=False)
+    try:
+        yield session
+    finally:
+        await session.close()
\ No newline at end of file
@@ -6,7 +6,13 @@ from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from app.api.api_v1.api import api_router
+from app.api.pagination import NEXT_CURSOR_HEADER
 from app.core.config import settings
+from app.core.executor import render_lanes
+from app.core.jobs import job_runner
+from app.core.pandoc import converter_pool, pdf_converter_pool
+from app.core.templates import template_index
+from app.db.pool import RequestScopeMiddleware
 from app.core.rate_limiting import limiter
 
 app = FastAPI(
@@ -23,8 +29,30 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 app.add_middleware(GZipMiddleware)
 app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=settings.BACKEND_TRUSTED_PROXY_IPS)
+# attributes database connection hold times to routes
+app.add_middleware(RequestScopeMiddleware)
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.on_event("startup")
+def build_template_index() -> None:
+    template_index.refresh()
+
+
+@app.on_event("startup")
+def start_job_runner() -> None:
+    job_runner.start()
+
+
+@app.on_event("shutdown")
+def shutdown_render_pipeline() -> None:
+    job_runner.stop()
+    for executor in render_lanes.values():
+        executor.shutdown()
+    converter_pool.shutdown()
+    pdf_converter_pool.shutdown()
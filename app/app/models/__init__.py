@@ -3,6 +3,8 @@ from .license import *  # noqa
 from .license_domain import *  # noqa
 from .license_restriction import *  # noqa
 from .license_source import *  # noqa
+from .render_job import *  # noqa
+from .template_version import *  # noqa
 from .link_tables import *  # noqa
 from .token import *  # noqa
 from .msg import *  # noqa
@@ -1,17 +1,23 @@
 import datetime
 from typing import TYPE_CHECKING, Literal, Optional
 import uuid as uuid_pkg
-from sqlalchemy import String
+from sqlalchemy import JSON, Column, Index, String
+from sqlalchemy.dialects.postgresql import JSONB
 from pydantic import root_validator, validator, AnyUrl
 from sqlmodel import Field, Relationship, SQLModel
 import sqlmodel
-from dulwich.repo import Repo
 
 from .link_tables import License_LicenseRestriction_Link
 if TYPE_CHECKING:
     from .license_restriction import LicenseRestriction, License_LicenseRestriction_Link
 
 
+def _current_template_sha() -> str:
+    # imported here, since the template module depends on the models
+    from app.core.templates import current_template_sha
+    return current_template_sha()
+
+
 class LicenseBase(SQLModel):
     timestamp: datetime.datetime = sqlmodel.Field(nullable=False, sa_type=sqlmodel.DateTime(timezone=True))
     name: str = Field(nullable=False)
@@ -36,6 +42,9 @@ class LicenseCreate(LicenseBase):
     restriction_ids: list[int] = Field(min_items=1)
     
 class License(LicenseBase, table=True):
+    # keyset pagination of the license list
+    __table_args__ = (Index("ix_license_timestamp_id", "timestamp", "id"),)
+
     id: uuid_pkg.UUID = Field(
         default_factory=uuid_pkg.uuid4,
         primary_key=True,
@@ -44,9 +53,14 @@ class License(LicenseBase, table=True):
     )
     git_commit_hash: str = Field(
         nullable=False,
-        default=Repo.discover().head().decode("ascii")
+        default_factory=_current_template_sha
     )
+    # template source at git_commit_hash, if the template registry knows it
+    template_version_hash: Optional[str] = Field(default=None, foreign_key="templateversion.content_hash")
     restrictions: list["LicenseRestriction"] = Relationship(back_populates='licenses_with_restrictions', link_model=License_LicenseRestriction_Link)
+    # domain grouped and lettered restriction texts at creation time, so that
+    # generation needs no joins and later edits of restrictions do not change the license
+    restriction_snapshot: Optional[list] = Field(default=None, sa_column=Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True))
 
 class LicenseRead(LicenseBase):
     id: uuid_pkg.UUID
@@ -0,0 +1,46 @@
+import datetime
+from typing import Literal, Optional
+import uuid as uuid_pkg
+
+from sqlalchemy import Column, ForeignKey, LargeBinary, String
+from sqlmodel import Field, SQLModel
+import sqlmodel
+from sqlmodel.sql.sqltypes import GUID
+
+from .template_version import GIT_SHA_PATTERN
+
+
+class RenderJobBase(SQLModel):
+    license_id: uuid_pkg.UUID
+    media_type: str = Field(default="application/pdf")
+    git_sha: Optional[str] = Field(default=None)
+
+class RenderJobCreate(RenderJobBase):
+    git_sha: Optional[str] = Field(default=None, regex=GIT_SHA_PATTERN)
+
+class RenderJob(RenderJobBase, table=True):
+    id: uuid_pkg.UUID = Field(
+        default_factory=uuid_pkg.uuid4,
+        primary_key=True,
+        index=True,
+        nullable=False,
+    )
+    # jobs are removed together with their license
+    license_id: uuid_pkg.UUID = Field(sa_column=Column(GUID(), ForeignKey("license.id", ondelete="CASCADE"), nullable=False, index=True))
+    git_sha: str = Field(nullable=False)
+    status: Literal["pending", "running", "finished", "failed"] = Field(default="pending", nullable=False, index=True, sa_type=String)
+    attempts: int = Field(default=0, nullable=False)
+    error: Optional[str] = Field(default=None)
+    created_at: datetime.datetime = sqlmodel.Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False, sa_type=sqlmodel.DateTime(timezone=True))
+    updated_at: datetime.datetime = sqlmodel.Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False, sa_type=sqlmodel.DateTime(timezone=True))
+    finished_at: Optional[datetime.datetime] = sqlmodel.Field(default=None, sa_type=sqlmodel.DateTime(timezone=True))
+    result: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+
+class RenderJobRead(RenderJobBase):
+    id: uuid_pkg.UUID
+    git_sha: str
+    status: str
+    attempts: int
+    error: Optional[str]
+    created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime]
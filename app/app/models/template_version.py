@@ -0,0 +1,20 @@
+import datetime
+
+from sqlalchemy import Column, Text
+from sqlmodel import Field, SQLModel
+import sqlmodel
+
+# template versions that can be requested: a full commit sha, or 'head' for
+# the local working copy
+GIT_SHA_PATTERN = "^([0-9a-f]{40}|head)$"
+
+class TemplateVersion(SQLModel, table=True):
+    # sha256 of the template source, every distinct source is stored once
+    content_hash: str = Field(primary_key=True, nullable=False)
+    source: str = Field(sa_column=Column(Text, nullable=False))
+
+class TemplateRevision(SQLModel, table=True):
+    git_sha: str = Field(primary_key=True, nullable=False)
+    template_file: str = Field(primary_key=True, nullable=False)
+    content_hash: str = Field(foreign_key="templateversion.content_hash", nullable=False)
+    committed_at: datetime.datetime = sqlmodel.Field(nullable=False, index=True, sa_type=sqlmodel.DateTime(timezone=True))
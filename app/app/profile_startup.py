@@ -0,0 +1,68 @@
+"""
+Report where the startup time of an API worker goes: the import time of each
+module and the run time of each startup handler of the app.
+
+    python -m app.profile_startup [--top N]
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Import module in a fresh interpreter and return (module, self us,
+    cumulative us) of every module it imported, as reported by -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def run_handler(handler) -> None:
+    if asyncio.iscoroutinefunction(handler):
+        asyncio.run(handler())
+    else:
+        handler()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20, help="number of modules to list")
+    args = parser.parse_args()
+
+    times = import_times("app.main")
+    print(f"slowest {args.top} modules by own import time")
+    for name, self_us, cumulative_us in sorted(times, key=lambda t: t[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}")
+    print("app modules by total import time")
+    for name, self_us, cumulative_us in sorted(times, key=lambda t: t[2], reverse=True):
+        if name == "app" or name.startswith("app."):
+            print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}")
+
+    start = time.perf_counter()
+    from app.main import app
+    print(f"import app.main {(time.perf_counter() - start) * 1000:8.1f} ms")
+    for handler in app.router.on_startup:
+        start = time.perf_counter()
+        run_handler(handler)
+        print(f"startup {handler.__name__:30} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    for handler in app.router.on_shutdown:
+        run_handler(handler)
+
+
+if __name__ == "__main__":
+    main()
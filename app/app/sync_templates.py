@@ -0,0 +1,25 @@
+import logging
+
+from app import crud
+from app.core.rendering import TEMPLATE_FILES
+from app.core.templates import template_index
+from app.db.session import Session
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logger.info("Syncing template versions")
+    if template_index.repo is None:
+        logger.error("No git repository found, nothing to sync")
+        return
+    template_index.refresh()
+    with Session() as db:
+        versions, revisions = crud.template_version.sync(db, revisions=template_index.revisions())
+        licenses = crud.template_version.link_licenses(db, template_files=TEMPLATE_FILES)
+    logger.info("Template versions synced: %s new versions, %s new revisions, %s licenses linked", versions, revisions, licenses)
+
+
+if __name__ == "__main__":
+    main()
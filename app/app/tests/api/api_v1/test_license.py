@@ -0,0 +1,29 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.executor import render_lanes
+from app.tests.utils.license import create_random_license
+
+
+def test_generate_with_invalid_git_sha(client: TestClient, db: Session) -> None:
+    license_id = create_random_license(db).id
+    r = client.get(f"{settings.API_V1_STR}/license/{license_id}/generate", params={"git_sha": "../../x"})
+    assert r.status_code == 422
+
+
+def test_conditional_generate_does_not_wait_for_lane(client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    license_id = create_random_license(db).id
+    params = {"media_type": "text/rtf"}
+    r = client.get(f"{settings.API_V1_STR}/license/{license_id}/generate", params=params)
+    assert r.status_code == 200
+    etag = r.headers["ETag"]
+
+    lane = render_lanes["convert"]
+    monkeypatch.setattr(lane, "pending", lane.max_workers + lane.queue_size)
+    r = client.get(f"{settings.API_V1_STR}/license/{license_id}/generate", params=params, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag
+    r = client.get(f"{settings.API_V1_STR}/license/{license_id}/generate", params=params)
+    assert r.status_code == 503
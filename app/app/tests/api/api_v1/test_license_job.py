@@ -0,0 +1,22 @@
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_create_job_for_unknown_license(client: TestClient) -> None:
+    data = {"license_id": str(uuid.uuid4()), "media_type": "application/pdf"}
+    r = client.post(f"{settings.API_V1_STR}/license/job/", json=data)
+    assert r.status_code == 404
+
+
+def test_create_job_with_unsupported_media_type(client: TestClient) -> None:
+    data = {"license_id": str(uuid.uuid4()), "media_type": "image/png"}
+    r = client.post(f"{settings.API_V1_STR}/license/job/", json=data)
+    assert r.status_code == 422
+
+
+def test_read_unknown_job(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/license/job/{uuid.uuid4()}")
+    assert r.status_code == 404
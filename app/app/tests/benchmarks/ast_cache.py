@@ -0,0 +1,77 @@
+"""
+Conversion cost per format with and without the cached pandoc AST.
+
+Without the cache every format parses the rendered markdown again, with it
+the markdown is parsed once and every format is converted from the AST.
+
+    python -m app.tests.benchmarks.ast_cache [--runs N] [--pdf]
+"""
+import argparse
+import datetime
+import statistics
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from jinja2 import Template
+
+from app.core.pandoc import converter_pool
+from app.core.rendering import MediaType, convert, parse_markdown
+
+TEMPLATE_DIR = Path(__file__).resolve().parents[2] / "templates"
+
+context: Dict[str, Any] = dict(
+    ARTIFACTS=["Application", "Model", "Source Code"],
+    SHORT_ARTIFACT_NAME="AMS",
+    LICENSE_NAME="Benchmark",
+    RESTRICTIONS={
+        "Surveillance": [["a", "restriction " * 20], ["b", "restriction " * 20]],
+        "Health": [["a", "restriction " * 20]],
+    },
+    LICENSE_TIMESTAMP=datetime.datetime(2024, 1, 1),
+    LICENSE_ID=uuid.uuid4(),
+    LICENSE_TEMPLATE_VERSION="0" * 40,
+)
+
+
+def median_ms(fn: Callable[[], Any], runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--pdf", action="store_true", help="include pdf, which needs a LaTeX installation")
+    args = parser.parse_args()
+
+    markdown = Template((TEMPLATE_DIR / "OpenRAIL-AMS.jinja").read_text()).render(**context)
+    media_types: List[MediaType] = [MediaType.rtf, MediaType.latex]
+    if args.pdf:
+        media_types.append(MediaType.pdf)
+
+    try:
+        # start the converters outside of the measurements
+        ast = parse_markdown(markdown)
+        parse = median_ms(lambda: parse_markdown(markdown), args.runs)
+        print(f"{'parse':8} {parse:8.1f} ms")
+        without_total = 0.0
+        with_total = parse
+        for media_type in media_types:
+            without = median_ms(lambda: convert(markdown, media_type), args.runs)
+            with_ast = median_ms(lambda: convert(None, media_type, ast), args.runs)
+            without_total += without
+            with_total += with_ast
+            print(f"{media_type.name:8} {without:8.1f} ms from markdown {with_ast:8.1f} ms from the cached AST")
+        print(f"{'all':8} {without_total:8.1f} ms from markdown {with_total:8.1f} ms including the parse")
+    finally:
+        converter_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
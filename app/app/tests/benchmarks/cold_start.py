@@ -0,0 +1,65 @@
+"""
+Cold start time of an API worker: a fresh interpreter imports app.main and
+runs the startup handlers, as a gunicorn worker does before it can serve.
+
+Fails if modules that are supposed to be imported on first use are imported
+at startup, or if the median exceeds --max-seconds.
+
+    python -m app.tests.benchmarks.cold_start [--runs N] [--max-seconds S]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# imported on first use, see app.core.templates, app.core.pandoc and app.core.rendering
+DEFERRED_MODULES = ["dulwich.repo", "pypandoc", "jinja2"]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+deferred = [module for module in %r if module in sys.modules]
+for handler in app.router.on_startup:
+    handler()
+started = time.perf_counter()
+for handler in app.router.on_shutdown:
+    handler()
+print(json.dumps({"import": imported - start, "startup": started - imported, "deferred": deferred}))
+""" % DEFERRED_MODULES
+
+
+def cold_start() -> dict:
+    result = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if the median cold start is slower")
+    args = parser.parse_args()
+
+    runs = [cold_start() for _ in range(args.runs)]
+    imports = [run["import"] for run in runs]
+    startups = [run["startup"] for run in runs]
+    totals = [run["import"] + run["startup"] for run in runs]
+    print(f"import   median {statistics.median(imports) * 1000:8.1f} ms  min {min(imports) * 1000:8.1f} ms")
+    print(f"startup  median {statistics.median(startups) * 1000:8.1f} ms  min {min(startups) * 1000:8.1f} ms")
+    print(f"total    median {statistics.median(totals) * 1000:8.1f} ms  min {min(totals) * 1000:8.1f} ms")
+
+    failed = False
+    eager = sorted({module for run in runs for module in run["deferred"]})
+    if eager:
+        print("imported at startup although deferred: " + ", ".join(eager))
+        failed = True
+    if args.max_seconds is not None and statistics.median(totals) > args.max_seconds:
+        print(f"median cold start exceeds {args.max_seconds} s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
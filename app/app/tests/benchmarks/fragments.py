@@ -0,0 +1,70 @@
+"""
+Rendering and conversion cost of a license with and without fragment
+precompilation of the template.
+
+    python -m app.tests.benchmarks.fragments [--runs N]
+"""
+import argparse
+import datetime
+import statistics
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from jinja2 import Template
+
+from app.core.fragments import FragmentedTemplate
+from app.core.pandoc import converter_pool
+
+TEMPLATE_DIR = Path(__file__).resolve().parents[2] / "templates"
+
+context: Dict[str, Any] = dict(
+    ARTIFACTS=["Model", "Source Code"],
+    SHORT_ARTIFACT_NAME="MS",
+    LICENSE_NAME="Benchmark",
+    RESTRICTIONS={
+        "Surveillance": [["a", "restriction " * 20], ["b", "restriction " * 20]],
+        "Health": [["a", "restriction " * 20]],
+    },
+    LICENSE_TIMESTAMP=datetime.datetime(2024, 1, 1),
+    LICENSE_ID=uuid.uuid4(),
+    LICENSE_TEMPLATE_VERSION="0" * 40,
+)
+
+
+def median_ms(fn: Callable[[], Any], runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    source = (TEMPLATE_DIR / "OpenRAIL-AMS.jinja").read_text()
+    template = Template(source)
+    fragmented = FragmentedTemplate(source)
+    markdown = template.render(**context)
+
+    whole = median_ms(lambda: template.render(**context).encode("utf-8"), args.runs * 100)
+    fragments = median_ms(lambda: fragmented.render(context).encode(), args.runs * 100)
+    print(f"{'markdown':8} {whole:8.3f} ms whole template {fragments:8.3f} ms fragments")
+    try:
+        for to in ["rtf", "latex"]:
+            # converts the static fragments and checks the assembled document
+            fragmented.render(context).convert(to, converter_pool.convert)
+            whole = median_ms(lambda: converter_pool.convert(markdown, to), args.runs)
+            fragments = median_ms(lambda: fragmented.render(context).convert(to, converter_pool.convert), args.runs)
+            print(f"{to:8} {whole:8.3f} ms whole document {fragments:8.3f} ms fragments")
+    finally:
+        converter_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
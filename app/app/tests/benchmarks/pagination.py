@@ -0,0 +1,83 @@
+"""
+Cost of a page of the license list at increasing depths, with skip/limit
+and with the keyset cursor.
+
+Fills a fresh database with --rows licenses, an in-memory SQLite database
+unless --url points to another (empty) one, e.g. a scratch PostgreSQL database.
+
+    python -m app.tests.benchmarks.pagination [--rows N] [--limit N] [--runs N] [--url URL]
+"""
+import argparse
+import datetime
+import statistics
+import time
+import uuid
+from typing import Any, Callable
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import crud, models
+
+
+def median_ms(fn: Callable[[], Any], runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def fill(session: Session, rows: int) -> None:
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    table = models.License.__table__
+    batch = 50000
+    for offset in range(0, rows, batch):
+        session.execute(table.insert(), [
+            dict(
+                id=uuid.uuid4(),
+                timestamp=start + datetime.timedelta(seconds=index),
+                name=f"license {index}",
+                license="OpenRAIL",
+                application=False,
+                model=True,
+                sourcecode=False,
+                data=False,
+                git_commit_hash="0" * 40,
+            )
+            for index in range(offset, min(offset + batch, rows))
+        ])
+    session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--url", default="sqlite://")
+    args = parser.parse_args()
+
+    if args.url.startswith("sqlite"):
+        engine = create_engine(args.url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        engine = create_engine(args.url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        start = time.perf_counter()
+        fill(session, args.rows)
+        print(f"inserted {args.rows} licenses in {time.perf_counter() - start:.1f} s")
+
+        depths = [depth for depth in [0, 1_000, 10_000, 100_000, args.rows // 2, args.rows - args.limit] if depth < args.rows]
+        for depth in sorted(set(depths)):
+            # the cursor of the page at depth is the last row of the page before it
+            cursor = crud.license.encode_cursor(crud.license.get_multi(session, skip=depth - 1, limit=1)[0]) if depth else None
+            offset = median_ms(lambda: crud.license.get_multi(session, skip=depth, limit=args.limit), args.runs)
+            keyset = median_ms(lambda: crud.license.get_page(session, cursor=cursor, limit=args.limit), args.runs)
+            assert crud.license.get_page(session, cursor=cursor, limit=args.limit)[0] == crud.license.get_multi(session, skip=depth, limit=args.limit)
+            print(f"row {depth:9} {offset:9.2f} ms skip {keyset:9.2f} ms cursor")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Throughput of the markdown download before and after chunked streaming.
+
+Drives a minimal ASGI app with the same GZipMiddleware as app.main directly,
+so that the numbers are not dominated by a test client or the network.
+
+    python -m app.tests.benchmarks.streaming [requests]
+"""
+import asyncio
+import datetime
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from jinja2 import Template
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from app.core.streaming import iter_chunks
+
+TEMPLATE_DIR = Path(__file__).resolve().parents[2] / "templates"
+
+template = Template((TEMPLATE_DIR / "OpenRAIL-AMS.jinja").read_text())
+context: Dict[str, Any] = dict(
+    ARTIFACTS=["Model", "Source Code"],
+    SHORT_ARTIFACT_NAME="MS",
+    LICENSE_NAME="Benchmark",
+    RESTRICTIONS={
+        "Surveillance": [["a", "restriction " * 20], ["b", "restriction " * 20]],
+        "Health": [["a", "restriction " * 20]],
+    },
+    LICENSE_TIMESTAMP=datetime.datetime(2024, 1, 1),
+    LICENSE_ID=uuid.uuid4(),
+    LICENSE_TEMPLATE_VERSION="0" * 40,
+)
+
+
+def per_character(request: Request) -> Response:
+    return StreamingResponse(iter(template.render(**context)), media_type="application/octet-stream")
+
+
+def chunked(request: Request) -> Response:
+    return StreamingResponse(iter_chunks(template.generate(**context), 64 * 1024), media_type="application/octet-stream")
+
+
+def full_body(request: Request) -> Response:
+    return Response(template.render(**context), media_type="application/octet-stream")
+
+
+app = Starlette(
+    routes=[
+        Route("/per-character", per_character),
+        Route("/chunked", chunked),
+        Route("/full-body", full_body),
+    ],
+    middleware=[Middleware(GZipMiddleware)],
+)
+
+
+async def request(path: str, on_send: Callable[[], None]) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"accept-encoding", b"gzip")],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 1234),
+    }
+
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # streaming responses listen for a disconnect until the body is sent
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        on_send()
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            finished.set()
+
+    await app(scope, receive, send)
+
+
+async def run(path: str, n: int) -> None:
+    sends = 0
+
+    def on_send() -> None:
+        nonlocal sends
+        sends += 1
+
+    start = time.perf_counter()
+    for _ in range(n):
+        await request(path, on_send)
+    elapsed = time.perf_counter() - start
+    print(f"{path:15} {n / elapsed:10.1f} req/s {sends / n:10.1f} ASGI sends/request")
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for path in ["/per-character", "/chunked", "/full-body"]:
+        asyncio.run(run(path, n))
+
+
+if __name__ == "__main__":
+    main()
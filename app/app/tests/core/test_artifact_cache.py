@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from app.core.artifact_cache import ArtifactCache
+
+
+def test_artifact_cache_promotes_disk_hits(tmp_path: Path) -> None:
+    cache = ArtifactCache(memory_size=4, directory=str(tmp_path), disk_size=1024)
+    cache.put("license", "sha", "text/plain", "v1", b"content")
+    cache.memory.clear()
+    assert cache.get("license", "sha", "text/plain", "v1") == b"content"
+    assert cache.disk.stats()["hits"] == 1
+    assert cache.get("license", "sha", "text/plain", "v1") == b"content"
+    assert cache.memory.stats()["hits"] == 1
+
+
+def test_artifact_cache_disk_tier_is_size_capped(tmp_path: Path) -> None:
+    cache = ArtifactCache(memory_size=4, directory=str(tmp_path), disk_size=10)
+    cache.put("a", "sha", "text/plain", "v1", b"12345")
+    cache.put("b", "sha", "text/plain", "v1", b"12345")
+    cache.put("c", "sha", "text/plain", "v1", b"12345")
+    assert cache.disk.stats()["size_bytes"] == 10
+    assert cache.disk.stats()["evictions"] == 1
+    assert cache.disk.get(("a", "sha", "text/plain", "v1")) is None
+
+
+def test_artifact_cache_invalidate_license(tmp_path: Path) -> None:
+    cache = ArtifactCache(memory_size=4, directory=str(tmp_path), disk_size=1024)
+    cache.put("a", "sha", "text/plain", "v1", b"a")
+    cache.put("a", "sha", "text/rtf", "v1", b"a")
+    cache.put("b", "sha", "text/plain", "v1", b"b")
+    cache.invalidate("a")
+    assert cache.get("a", "sha", "text/plain", "v1") is None
+    assert cache.get("a", "sha", "text/rtf", "v1") is None
+    assert cache.get("b", "sha", "text/plain", "v1") == b"b"
+
+
+def test_disk_cache_paths_stay_in_directory(tmp_path: Path) -> None:
+    cache = ArtifactCache(memory_size=4, directory=str(tmp_path / "cache"), disk_size=1024)
+    cache.put("../license", "../../x", "text/plain", "v1", b"content")
+    assert [path.parent.parent for path in (tmp_path / "cache").rglob("*") if path.is_file()] == [tmp_path / "cache"]
+    cache.memory.clear()
+    assert cache.get("../license", "../../x", "text/plain", "v1") == b"content"
+
+
+def test_artifact_cache_keys_by_version(tmp_path: Path) -> None:
+    cache = ArtifactCache(memory_size=4, directory=str(tmp_path), disk_size=1024)
+    cache.put("a", "sha", "text/plain", "v1", b"old")
+    # a changed license has a new version, whether or not this process invalidated it
+    assert cache.get("a", "sha", "text/plain", "v2") is None
+    cache.put("a", "sha", "text/plain", "v2", b"new")
+    assert cache.get("a", "sha", "text/plain", "v2") == b"new"
@@ -0,0 +1,45 @@
+from app.core.cache import LRUCache
+
+
+def test_lru_cache_hit_and_miss() -> None:
+    cache = LRUCache(maxsize=2)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    # touch "a" so that "b" becomes the least recently used entry
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_cache_get_or_create_calls_factory_once() -> None:
+    cache = LRUCache(maxsize=2)
+    calls = []
+
+    def factory() -> str:
+        calls.append(1)
+        return "value"
+
+    assert cache.get_or_create("key", factory) == "value"
+    assert cache.get_or_create("key", factory) == "value"
+    assert len(calls) == 1
+
+
+def test_lru_cache_invalidate() -> None:
+    cache = LRUCache(maxsize=4)
+    cache.put(("x", 1), 1)
+    cache.put(("x", 2), 2)
+    cache.put(("y", 1), 3)
+    assert cache.invalidate(lambda key: key[0] == "x") == 2
+    assert len(cache) == 1
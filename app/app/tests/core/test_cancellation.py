@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.cancellation import CancelScope, RenderCancelled, check_cancelled, render_outcomes, run_cancellable
+from app.core.config import settings
+from app.core.executor import RenderExecutor
+from app.core.pandoc import ConverterPool
+
+# takes pandoc a few seconds to convert
+SLOW_DOCUMENT = "*word* " * 500000
+
+
+def test_run_cancellable_completes() -> None:
+    executor = RenderExecutor(max_workers=1, queue_size=1)
+
+    async def connected() -> bool:
+        return False
+
+    completed = render_outcomes.completed
+    assert asyncio.run(run_cancellable(executor.run, connected, lambda x: x * 2, 21)) == 42
+    assert render_outcomes.completed == completed + 1
+
+
+def test_run_cancellable_aborts_at_stage_boundary(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "RENDER_DISCONNECT_POLL_INTERVAL", 0.01)
+    executor = RenderExecutor(max_workers=1, queue_size=1)
+    started = threading.Event()
+
+    def render() -> None:
+        started.set()
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    async def disconnected() -> bool:
+        return started.is_set()
+
+    aborted = render_outcomes.aborted
+    with pytest.raises(RenderCancelled):
+        asyncio.run(run_cancellable(executor.run, disconnected, render))
+    assert render_outcomes.aborted == aborted + 1
+    assert executor.stats()["active"] == 0
+
+
+def test_cancel_kills_running_conversion() -> None:
+    pool = ConverterPool(size=1, queue_size=1, timeout=60, use_server=False)
+    scope = CancelScope()
+    threading.Timer(0.5, scope.cancel).start()
+    start = time.perf_counter()
+    try:
+        with pytest.raises(RenderCancelled):
+            scope.run(pool.convert, SLOW_DOCUMENT, "latex")
+    finally:
+        pool.shutdown()
+    assert time.perf_counter() - start < 2
+    assert pool.stats()["cancelled"] == 1
+    assert pool.stats()["active"] == 0
+
+
+def test_cancelled_scope_does_not_start_conversions() -> None:
+    pool = ConverterPool(size=1, queue_size=1, timeout=30)
+    scope = CancelScope()
+    scope.cancel()
+    with pytest.raises(RenderCancelled):
+        scope.run(pool.convert, "text", "latex")
+    assert pool.stats()["conversions"] == 0
@@ -0,0 +1,63 @@
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, exc, text
+
+from app.db.pool import InstrumentedQueuePool, instrument, request_scope
+
+
+def test_pool_metrics(tmp_path: Path) -> None:
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_pre_ping=True,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    pool_metrics = instrument(engine, "test_db_pool")
+    with engine.connect() as connection:
+        connection.execute(text("select 1"))
+        assert pool_metrics.stats()["checked_out"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        dbapi_connection = connection.connection.dbapi_connection
+    # the pre-ping of the next checkout finds the pooled connection dead
+    dbapi_connection.close()
+    with engine.connect() as connection:
+        connection.execute(text("select 1"))
+
+    stats = pool_metrics.stats()
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] == 2
+    assert stats["checkout_timeouts"] == 1
+    assert stats["checkout_seconds_max"] < 0.05
+    assert stats["connects"] == 2
+    assert stats["pre_ping_failures"] == 1
+
+    engine.dispose()
+    with engine.connect():
+        assert pool_metrics.stats()["checked_out"] == 1
+    assert pool_metrics.stats()["checkouts"] == 3
+
+
+def test_pool_metrics_hold_time_by_route(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool)
+    pool_metrics = instrument(engine, "test_db_pool")
+    with engine.connect():
+        pass
+    scope = {"type": "http", "method": "GET", "route": None}
+    token = request_scope.set(scope)
+    try:
+        with engine.connect():
+            # routed after the request started
+            scope["route"] = APIRoute("/license/{id}/generate", lambda: None)
+            time.sleep(0.01)
+    finally:
+        request_scope.reset(token)
+    hold_seconds = pool_metrics.stats()["hold_seconds"]
+    assert hold_seconds["background"]["count"] == 1
+    assert hold_seconds["GET /license/{id}/generate"]["count"] == 1
+    assert hold_seconds["GET /license/{id}/generate"]["max"] >= 0.01
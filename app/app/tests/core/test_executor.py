@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.executor import ExecutorBusyError, RenderExecutor
+
+
+def test_render_executor_runs_jobs() -> None:
+    executor = RenderExecutor(max_workers=1, queue_size=1)
+    assert asyncio.run(executor.run(lambda x: x * 2, 21)) == 42
+    assert executor.stats()["completed"] == 1
+
+
+def test_render_executor_counts_failures_apart() -> None:
+    executor = RenderExecutor(max_workers=1, queue_size=1)
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(executor.run(lambda: 1 / 0))
+    stats = executor.stats()
+    assert stats["failed"] == 1
+    assert stats["completed"] == 0
+    assert stats["active"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_render_executor_rejects_when_queue_is_full() -> None:
+    executor = RenderExecutor(max_workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def main() -> None:
+        running = asyncio.ensure_future(executor.run(release.wait))
+        waiting = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert executor.stats()["active"] == 1
+        assert executor.stats()["queue_depth"] == 1
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(running, waiting)
+
+    asyncio.run(main())
+    assert executor.stats()["rejected"] == 1
+    assert executor.stats()["completed"] == 2
+
+
+def test_render_lanes_do_not_delay_each_other() -> None:
+    pdf = RenderExecutor(max_workers=1, queue_size=1, name="pdf")
+    fast = RenderExecutor(max_workers=1, queue_size=1, name="fast")
+    release = threading.Event()
+
+    async def main() -> None:
+        burst = [asyncio.ensure_future(pdf.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorBusyError):
+            await pdf.run(release.wait)
+        # the full pdf lane neither delays nor rejects the fast lane
+        assert await asyncio.wait_for(fast.run(lambda: "markdown"), timeout=1) == "markdown"
+        release.set()
+        await asyncio.gather(*burst)
+
+    asyncio.run(main())
+
+
+def test_render_executor_forgets_cancelled_queued_jobs() -> None:
+    executor = RenderExecutor(max_workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def main() -> None:
+        running = asyncio.ensure_future(executor.run(release.wait))
+        waiting = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.sleep(0.05)
+        try:
+            assert executor.stats()["queue_depth"] == 0
+            # the freed queue slot is accepted again
+            queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        finally:
+            release.set()
+        await running
+        assert await queued == "queued"
+
+    asyncio.run(main())
+    assert executor.pending == 0
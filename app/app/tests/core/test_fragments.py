@@ -0,0 +1,79 @@
+from typing import List
+
+import pytest
+from jinja2 import Template
+
+from app.core.fragments import FRAGMENT_BREAK, FragmentedTemplate, split_fragments
+from app.core.pandoc import ConverterPool
+from app.core.rendering import TEMPLATE_FILES
+from app.tests.utils.template import get_template_context, get_template_source
+
+
+@pytest.fixture(scope="module")
+def pool() -> ConverterPool:
+    pool = ConverterPool(size=1, queue_size=1, timeout=30)
+    yield pool
+    pool.shutdown()
+
+
+def test_split_fragments() -> None:
+    source = (
+        "### **{{ NAME }}**\n\n"
+        "Static text.\n\n"
+        "1. First\n\n"
+        "2. Second\n\n"
+        "{% for item in ITEMS %}\n"
+        "- {{ item }}\n\n"
+        "{% endfor %}\n"
+        "More text.\n"
+    )
+    assert split_fragments(source) == [
+        "### **{{ NAME }}**\n\n",
+        "Static text.\n\n1. First\n\n2. Second\n\n",
+        "{% for item in ITEMS %}\n- {{ item }}\n\n{% endfor %}\nMore text.\n",
+    ]
+    template = FragmentedTemplate(source)
+    assert [isinstance(fragment, str) for fragment in template.fragments] == [False, True, False]
+    assert template.fragments[1] == "Static text.\n\n1. First\n\n2. Second\n\n"
+
+
+@pytest.mark.parametrize("line_ending", ["\n", "\r\n"])
+@pytest.mark.parametrize("template_file", sorted(TEMPLATE_FILES.values()))
+def test_fragments_render_like_template(template_file: str, line_ending: str) -> None:
+    source = get_template_source(template_file).replace("\n", line_ending)
+    context = get_template_context()
+    document = FragmentedTemplate(source).render(context)
+    assert document.markdown == Template(source).render(**context)
+    assert document.encode() == document.markdown.encode("utf-8")
+
+
+@pytest.mark.parametrize("template_file", sorted(TEMPLATE_FILES.values()))
+def test_fragments_convert_like_document(pool: ConverterPool, template_file: str) -> None:
+    template = FragmentedTemplate(get_template_source(template_file))
+    documents = [template.render(get_template_context()), template.render(dict(get_template_context(), RESTRICTIONS={}))]
+    for to in ["rtf", "latex"]:
+        for document in documents:
+            assert document.convert(to, pool.convert) == pool.convert(document.markdown, to)
+        assert template.assembles(to)
+
+
+def test_fragments_convert_dynamic_fragments_at_once(pool: ConverterPool) -> None:
+    calls: List[str] = []
+
+    def converter(markdown: str, to: str) -> str:
+        calls.append(markdown)
+        return pool.convert(markdown, to)
+
+    template = FragmentedTemplate("### {{ NAME }}\n\nStatic text.\n\nBy {{ ITEM }}\n")
+    template.render(dict(NAME="first", ITEM="a")).convert("latex", converter)
+    calls.clear()
+    document = template.render(dict(NAME="second", ITEM="b"))
+    assert document.convert("latex", converter) == pool.convert(document.markdown, "latex")
+    assert len(calls) == 1
+    assert "Static text." not in calls[0]
+
+    # content that looks like the break between fragments is converted as a whole
+    calls.clear()
+    document = template.render(dict(NAME=FRAGMENT_BREAK, ITEM="b"))
+    assert document.convert("latex", converter) == pool.convert(document.markdown, "latex")
+    assert calls == [document.markdown]
@@ -0,0 +1,104 @@
+import datetime
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, Tuple
+import uuid as uuid_pkg
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import crud, models
+from app.core import jobs
+from app.core.jobs import JobRunner
+from app.tests.utils.license import build_license
+
+
+@pytest.fixture
+def engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Engine:
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+
+    @contextmanager
+    def session() -> Iterator[Session]:
+        with Session(engine) as db:
+            yield db
+
+    monkeypatch.setattr(jobs, "Session", session)
+    return engine
+
+
+def make_runner(max_attempts: int = 3) -> JobRunner:
+    return JobRunner(
+        workers=1,
+        max_attempts=max_attempts,
+        poll_interval=1,
+        result_ttl=datetime.timedelta(hours=1),
+        job_timeout=datetime.timedelta(minutes=5),
+        prerender_media_types=[],
+    )
+
+
+def add_job(engine: Engine) -> uuid_pkg.UUID:
+    with Session(engine) as db:
+        license = build_license(restriction_snapshot=[])
+        db.add(license)
+        db.commit()
+        job = models.RenderJob(license_id=license.id, git_sha=license.git_commit_hash, media_type="text/plain")
+        db.add(job)
+        db.commit()
+        return job.id
+
+
+def read_job(engine: Engine, job_id: uuid_pkg.UUID) -> Tuple[str, int, Any]:
+    with Session(engine) as db:
+        job = crud.render_job.get(db, id=job_id)
+        return job.status, job.attempts, job.result
+
+
+def test_job_runner_retries_up_to_max_attempts(engine: Engine, monkeypatch: pytest.MonkeyPatch) -> None:
+    def fail(*args: Any) -> bytes:
+        raise RuntimeError("pandoc failed")
+
+    monkeypatch.setattr(jobs, "render_artifact", fail)
+    runner = make_runner(max_attempts=2)
+    job_id = add_job(engine)
+    runner._run(job_id)
+    assert read_job(engine, job_id) == ("pending", 1, None)
+    runner._run(job_id)
+    assert read_job(engine, job_id) == ("failed", 2, None)
+    # a failed job is not claimed again
+    runner._run(job_id)
+    assert read_job(engine, job_id)[:2] == ("failed", 2)
+    assert runner.stats()["retried"] == 1
+    assert runner.stats()["failed"] == 1
+
+
+def test_job_runner_stores_result(engine: Engine, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(jobs, "render_artifact", lambda *args: b"document")
+    runner = make_runner()
+    job_id = add_job(engine)
+    runner._run(job_id)
+    assert read_job(engine, job_id) == ("finished", 1, b"document")
+    assert runner.stats()["finished"] == 1
+
+
+def test_job_runner_holds_no_connection_while_rendering(engine: Engine, monkeypatch: pytest.MonkeyPatch) -> None:
+    events: List[str] = []
+    event.listen(engine, "checkout", lambda *args: events.append("checkout"))
+    event.listen(engine, "checkin", lambda *args: events.append("checkin"))
+
+    def render(*args: Any) -> bytes:
+        events.append("render")
+        return b"document"
+
+    monkeypatch.setattr(jobs, "render_artifact", render)
+    job_id = add_job(engine)
+    events.clear()
+    make_runner()._run(job_id)
+    assert read_job(engine, job_id)[0] == "finished"
+    rendered = events.index("render")
+    # every connection was returned before the render and only taken again afterwards
+    assert events[:rendered].count("checkout") == events[:rendered].count("checkin")
+    assert events[rendered + 1] == "checkout"
@@ -0,0 +1,62 @@
+import io
+import socket
+import tempfile
+import zipfile
+from pathlib import Path
+
+import pypandoc
+import pytest
+
+from app.core.pandoc import ConversionTimeoutError, ConverterPool
+
+
+def test_converter_pool_matches_pypandoc() -> None:
+    pool = ConverterPool(size=1, queue_size=1, timeout=30)
+    text = "### **Title**\n\n- Model\n- Source Code\n"
+    try:
+        for to in ["plain", "rtf", "latex"]:
+            assert pool.convert(text, to) == pypandoc.convert_text(text, format="markdown", to=to)
+    finally:
+        pool.shutdown()
+    stats = pool.stats()
+    assert stats["conversions"] == 3
+    assert stats["active"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_converter_pool_binary_output_without_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # docx is a binary format that needs no pdf engine, pdf takes the same path
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    pool = ConverterPool(size=1, queue_size=1, timeout=30)
+    try:
+        output = pool.convert_binary("### **Title**\n", "docx")
+    finally:
+        pool.shutdown()
+    assert zipfile.ZipFile(io.BytesIO(output)).namelist()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_converter_pool_discards_workers_it_cannot_replace(monkeypatch: pytest.MonkeyPatch) -> None:
+    pool = ConverterPool(size=1, queue_size=1, timeout=30)
+    pool._ensure_started()
+    new_worker = pool._new_worker
+
+    def hang(worker, timeout):
+        raise socket.timeout()
+
+    def fail():
+        raise RuntimeError("pandoc is gone")
+
+    monkeypatch.setattr(pool, "_new_worker", fail)
+    try:
+        # the timeout is reported, not the failed replacement
+        with pytest.raises(ConversionTimeoutError):
+            pool._run(hang, None)
+        assert pool.stats()["vacant"] == 1
+        assert pool._idle.empty()
+        monkeypatch.setattr(pool, "_new_worker", new_worker)
+        assert pool.convert("*text*", "plain") == "text\n"
+        assert pool.stats()["vacant"] == 0
+        assert pool._idle.qsize() == 1
+    finally:
+        pool.shutdown()
@@ -0,0 +1,100 @@
+"""
+Golden file tests of the plain text writer. After a template change the
+golden files are regenerated with pandoc:
+
+    python -m app.tests.core.test_plain
+"""
+from pathlib import Path
+
+import pypandoc
+import pytest
+
+from app.core.plain import PlainTextWriter, UnsupportedMarkdown, markdown_to_plain
+from app.core.rendering import TEMPLATE_FILES
+from app.tests.utils.template import render_template
+
+GOLDEN_DIR = Path(__file__).resolve().parent / "golden"
+
+
+def golden_file(template_file: str) -> Path:
+    return GOLDEN_DIR / template_file.replace(".jinja", ".txt")
+
+
+@pytest.mark.parametrize("template_file", sorted(TEMPLATE_FILES.values()))
+def test_template_matches_golden_file(template_file: str) -> None:
+    markdown = render_template(template_file)
+    assert markdown_to_plain(markdown) == golden_file(template_file).read_text()
+
+
+@pytest.mark.parametrize("template_file", sorted(TEMPLATE_FILES.values()))
+def test_golden_file_matches_pandoc(template_file: str) -> None:
+    markdown = render_template(template_file)
+    assert pypandoc.convert_text(markdown, format="markdown", to="plain") == golden_file(template_file).read_text()
+
+
+def test_markdown_to_plain() -> None:
+    markdown = (
+        "### **Section 1**\n\n"
+        "It's \"quoted\" -- and 'single' --- e.g. this...\n\n"
+        "1. First\n\n"
+        "   (a) Lettered\n\n"
+        "   (b) Item\n\n"
+        "2. Second\n\n"
+        "~~~\n"
+        "code\n"
+        "~~~\n"
+    )
+    assert markdown_to_plain(markdown) == (
+        "Section 1\n\n"
+        "It’s “quoted” – and ‘single’ — e.g. this…\n\n"
+        "1.  First\n\n"
+        "    (a) Lettered\n\n"
+        "    (b) Item\n\n"
+        "2.  Second\n\n"
+        "    code\n"
+    )
+    assert markdown_to_plain(markdown) == pypandoc.convert_text(markdown, format="markdown", to="plain")
+
+
+def test_markdown_to_plain_wraps_lines() -> None:
+    markdown = " ".join(["word"] * 30) + "\n\n- " + " ".join(["item"] * 20) + "\n"
+    plain = markdown_to_plain(markdown)
+    assert all(len(line) <= 72 for line in plain.splitlines())
+    assert plain == pypandoc.convert_text(markdown, format="markdown", to="plain")
+
+
+@pytest.mark.parametrize(
+    "markdown",
+    [
+        # a trailing space after an abbreviation becomes a non-breaking space
+        "use e.g. \n\nnext\n",
+        "### see i.e. \n",
+        "- item e.g. \n- item cf. \n",
+        # unless it is part of a line break before the next item
+        "- item e.g.  \n- item\n",
+        "e.g.  \n",
+    ],
+)
+def test_markdown_to_plain_trailing_spaces(markdown: str) -> None:
+    assert markdown_to_plain(markdown) == pypandoc.convert_text(markdown, format="markdown", to="plain")
+
+
+@pytest.mark.parametrize("markdown", ["--- --\n", "- ---\n", "*emphasis*\n", "a [link](x)\n", "first line\nsecond line\n", "> quote\n"])
+def test_unsupported_markdown(markdown: str) -> None:
+    with pytest.raises(UnsupportedMarkdown):
+        markdown_to_plain(markdown)
+
+
+def test_plain_text_writer_falls_back() -> None:
+    writer = PlainTextWriter(lambda markdown: "fallback")
+    assert writer.convert("**supported**\n") == "supported\n"
+    assert writer.convert("*unsupported*\n") == "fallback"
+    assert writer.stats() == {"converted": 1, "fallbacks": 1}
+
+
+if __name__ == "__main__":
+    GOLDEN_DIR.mkdir(exist_ok=True)
+    for template_file in sorted(TEMPLATE_FILES.values()):
+        plain = pypandoc.convert_text(render_template(template_file), format="markdown", to="plain")
+        golden_file(template_file).write_text(plain)
+        print("Wrote", golden_file(template_file))
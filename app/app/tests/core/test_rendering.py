@@ -0,0 +1,66 @@
+from typing import Any
+
+import pytest
+
+from app import models
+from app.core.pandoc import converter_pool, pdf_converter_pool
+from app.core.rendering import MediaType, RenderContext, convert, etag_matches, get_content_version, get_render_lane, parse_markdown
+from app.tests.utils.license import build_license
+
+
+def test_etag_matches() -> None:
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"xyz", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"xyz"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_render_context_from_license() -> None:
+    domain = models.LicenseDomain(name="Surveillance")
+    license = build_license(
+        restrictions=[models.LicenseRestriction(text="first", domain=domain), models.LicenseRestriction(text="second", domain=domain)],
+    )
+    context = RenderContext.from_license(license)
+    assert context.id == license.id
+    assert context.restriction_snapshot == [["Surveillance", [["a", "first"], ["b", "second"]]]]
+    license.restriction_snapshot = [["Health", [["a", "snapshot"]]]]
+    assert RenderContext.from_license(license).restriction_snapshot == license.restriction_snapshot
+
+
+def test_content_version_follows_license_changes() -> None:
+    license = build_license(restriction_snapshot=[])
+    version = get_content_version(RenderContext.from_license(license), "0" * 40, MediaType.rtf)
+    assert get_content_version(RenderContext.from_license(license), "0" * 40, MediaType.rtf) == version
+    assert get_content_version(RenderContext.from_license(license), "0" * 40, MediaType.latex) != version
+    license.name = "renamed"
+    renamed = get_content_version(RenderContext.from_license(license), "0" * 40, MediaType.rtf)
+    assert renamed != version
+    license.restriction_snapshot = [["Health", [["a", "restriction"]]]]
+    assert get_content_version(RenderContext.from_license(license), "0" * 40, MediaType.rtf) != renamed
+
+
+def test_get_render_lane() -> None:
+    assert get_render_lane([MediaType.markdown]) == "fast"
+    assert get_render_lane([MediaType.plain, MediaType.latex]) == "convert"
+    assert get_render_lane([MediaType.markdown, MediaType.pdf, MediaType.rtf]) == "pdf"
+
+
+def test_pdf_conversions_use_converters_of_their_own(monkeypatch: pytest.MonkeyPatch) -> None:
+    def busy(*args: Any, **kwargs: Any) -> bytes:
+        raise AssertionError("pdf took a converter of the other formats")
+
+    monkeypatch.setattr(converter_pool, "convert_binary", busy)
+    monkeypatch.setattr(pdf_converter_pool, "convert_binary", lambda text, to, from_format: b"%PDF")
+    assert convert("# Title\n", MediaType.pdf) == b"%PDF"
+
+
+def test_convert_from_ast_matches_markdown() -> None:
+    markdown = "### **Title**\n\n\"Quoted\" text -- e.g. a list:\n\n1. Model\n\n   (a) Source Code\n"
+    try:
+        ast = parse_markdown(markdown)
+        for media_type in [MediaType.rtf, MediaType.latex]:
+            assert convert(None, media_type, ast) == convert(markdown, media_type)
+    finally:
+        converter_pool.shutdown()
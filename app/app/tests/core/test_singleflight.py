@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.cancellation import CancelScope, RenderCancelled
+from app.core.singleflight import SingleFlight
+
+
+def test_single_flight_shares_result() -> None:
+    flights = SingleFlight()
+    flight, leader = flights.begin("a")
+    assert leader
+    waiting, leader = flights.begin("a")
+    assert not leader
+    assert waiting is flight
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = [executor.submit(waiting.wait) for _ in range(4)]
+        flights.finish("a", result=42)
+    assert [result.result() for result in results] == [42] * 4
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 1}
+
+    # a finished flight is not reused
+    _, leader = flights.begin("a")
+    assert leader
+
+
+def test_single_flight_shares_error() -> None:
+    flights = SingleFlight()
+    flights.begin("a")
+    waiting, _ = flights.begin("a")
+    flights.finish("a", error=ValueError("failed"))
+    with pytest.raises(ValueError):
+        waiting.wait()
+
+
+def test_single_flight_coalesces_concurrent_callers() -> None:
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    computations = 0
+
+    def call() -> int:
+        nonlocal computations
+        flight, leader = flights.begin("a")
+        if not leader:
+            return flight.wait()
+        computations += 1
+        started.set()
+        release.wait()
+        flights.finish("a", result=1)
+        return 1
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        first = executor.submit(call)
+        started.wait()
+        others = [executor.submit(call) for _ in range(7)]
+        while flights.stats()["coalesced"] < 7:
+            time.sleep(0.001)
+        release.set()
+    assert first.result() == 1
+    assert [other.result() for other in others] == [1] * 7
+    assert computations == 1
+    assert flights.stats()["coalesced"] == 7
+
+
+def test_cancelled_follower_stops_waiting() -> None:
+    flights = SingleFlight()
+    flights.begin("a")
+    waiting, _ = flights.begin("a")
+    scopes = [CancelScope(), CancelScope()]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = [executor.submit(scope.run, waiting.wait) for scope in scopes]
+        time.sleep(0.05)
+        try:
+            scopes[0].cancel()
+            # the cancelled follower returns while the leader is still computing
+            with pytest.raises(RenderCancelled):
+                results[0].result(timeout=1)
+            assert not results[1].done()
+        finally:
+            flights.finish("a", result=42)
+        assert results[1].result(timeout=1) == 42
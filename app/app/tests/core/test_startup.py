@@ -0,0 +1,10 @@
+import subprocess
+import sys
+
+from app.tests.benchmarks.cold_start import DEFERRED_MODULES
+
+
+def test_heavy_modules_are_not_imported_at_startup() -> None:
+    code = "import sys; import app.main; print(','.join(m for m in %r if m in sys.modules))" % DEFERRED_MODULES
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
@@ -0,0 +1,23 @@
+import io
+import zipfile
+
+from app.core.streaming import iter_chunks, iter_zip
+
+
+def test_iter_chunks_joins_fragments() -> None:
+    chunks = list(iter_chunks(["ab", "c", "de", "f", "g"], 3))
+    assert chunks == [b"abc", b"def", b"g"]
+
+
+def test_iter_chunks_small_document_is_one_chunk() -> None:
+    assert list(iter_chunks(["a", "b", "c"], 1024)) == [b"abc"]
+
+
+def test_iter_zip_yields_one_chunk_per_entry() -> None:
+    files = [("license.md", b"# License"), ("license.txt", b"License")]
+    chunks = list(iter_zip(files))
+    # one chunk per entry and one for the central directory
+    assert len(chunks) == 3
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.read("license.md") == b"# License"
+    assert archive.read("license.txt") == b"License"
@@ -0,0 +1,38 @@
+from dulwich.object_store import tree_lookup_path
+
+from app.core.templates import TEMPLATE_REPO_DIR, TemplateIndex, get_repo
+
+repo = get_repo()
+
+
+def test_template_index_matches_git() -> None:
+    index = TemplateIndex(get_repo)
+    index.refresh()
+    head = repo.head()
+    commit = repo[head]
+    for template_file in ["OpenRAIL-AMS.jinja", "RAIL-AMS.jinja", "ResearchUseRAIL.jinja"]:
+        path = bytes(TEMPLATE_REPO_DIR + template_file, "utf-8")
+        mode, sha = tree_lookup_path(repo.get_object, commit.tree, path)
+        assert index.lookup(template_file, head.decode("ascii")) == repo[sha].data.decode("utf-8")
+
+
+def test_template_index_unknown_commit() -> None:
+    index = TemplateIndex(get_repo)
+    index.refresh()
+    assert index.lookup("OpenRAIL-AMS.jinja", "0" * 40) is None
+
+
+def test_template_index_revisions_match_lookup() -> None:
+    index = TemplateIndex(get_repo)
+    index.refresh()
+    revisions = list(index.revisions())
+    assert revisions
+    for git_sha, template_file, source, committed_at in revisions:
+        assert index.lookup(template_file, git_sha) == source
+        assert committed_at.tzinfo is not None
+
+
+def test_template_index_without_repository() -> None:
+    index = TemplateIndex(lambda: None)
+    index.refresh()
+    assert list(index.revisions()) == []
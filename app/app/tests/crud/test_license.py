@@ -0,0 +1,76 @@
+import datetime
+from typing import List
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app import crud, models
+
+
+def add_restrictions(db: Session, count: int) -> List[int]:
+    source = models.LicenseSource(name="source")
+    domains = [models.LicenseDomain(name="Surveillance"), models.LicenseDomain(name="Health")]
+    db.add_all([source, *domains])
+    db.commit()
+    restrictions = [
+        models.LicenseRestriction(text=f"restriction {index}", approved=index != 0, source_id=source.id, domain_id=domains[index % 2].id)
+        for index in range(count + 1)
+    ]
+    db.add_all(restrictions)
+    db.commit()
+    # the first one is not approved
+    return [restriction.id for restriction in restrictions]
+
+
+def create_license(db: Session, restriction_ids: List[int]) -> models.License:
+    license_in = models.LicenseCreate(
+        timestamp=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        name="mylic",
+        license="OpenRAIL",
+        model=True,
+        restriction_ids=restriction_ids,
+    )
+    restrictions = crud.license_restriction.get_approved_by_ids(db, ids=restriction_ids)
+    return crud.license.create_with_restrictions(db, obj_in=license_in, restrictions=restrictions, git_commit_hash="0" * 40)
+
+
+def test_get_approved_by_ids(db: Session) -> None:
+    ids = add_restrictions(db, 3)
+    restrictions = crud.license_restriction.get_approved_by_ids(db, ids=ids + [1000])
+    assert sorted(restriction.id for restriction in restrictions) == ids[1:]
+    assert {restriction.domain.name for restriction in restrictions} == {"Surveillance", "Health"}
+
+
+def test_create_with_restrictions_issues_constant_statements(db: Session) -> None:
+    ids = add_restrictions(db, 20)
+    statements: List[str] = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    counts = []
+    for restriction_ids in [ids[1:2], ids[1:]]:
+        statements.clear()
+        license = create_license(db, restriction_ids)
+        # the returned license is complete without further queries
+        assert [restriction.id for restriction in license.restrictions] == restriction_ids
+        assert [restriction.domain.name for restriction in license.restrictions]
+        assert license.git_commit_hash == "0" * 40
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+    stored = crud.license.get(db, id=license.id)
+    assert sorted(restriction.id for restriction in stored.restrictions) == ids[1:]
+
+
+def test_create_with_restrictions_leaves_other_objects_attached(db: Session) -> None:
+    ids = add_restrictions(db, 2)
+    source = crud.license_source.get_multi(db)[0]
+    create_license(db, ids[1:])
+    assert source in db
+
+
+def test_get_approved_by_ids_rejects_unapproved(db: Session) -> None:
+    ids = add_restrictions(db, 1)
+    assert crud.license_restriction.get_approved_by_ids(db, ids=ids[:1]) == []
+    db.get(models.LicenseRestriction, ids[0]).approved = True
+    db.commit()
+    assert [restriction.id for restriction in crud.license_restriction.get_approved_by_ids(db, ids=ids[:1])] == ids[:1]
@@ -0,0 +1,84 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, models
+from app.tests.utils.license import build_license
+
+
+def add_licenses(db: Session, count: int) -> None:
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    for index in range(count):
+        # pairs of licenses share a timestamp, the id breaks the tie
+        timestamp = start + datetime.timedelta(minutes=index // 2)
+        db.add(build_license(timestamp=timestamp, name=f"license {index}"))
+    db.commit()
+
+
+def test_get_page_walks_all_rows_once(db: Session) -> None:
+    add_licenses(db, 11)
+    expected = crud.license.get_multi(db, limit=100)
+    assert [(license.timestamp, license.id) for license in expected] == sorted((license.timestamp, license.id) for license in expected)
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = crud.license.get_page(db, cursor=cursor, limit=3)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert [license.id for license in seen] == [license.id for license in expected]
+    assert len(page) == 2
+
+
+def test_get_page_matches_offset_pages(db: Session) -> None:
+    for index in range(5):
+        db.add(models.LicenseDomain(name=f"domain {index}"))
+    db.commit()
+    first, cursor = crud.license_domain.get_page(db, limit=2)
+    second, _ = crud.license_domain.get_page(db, cursor=cursor, limit=2)
+    assert first == crud.license_domain.get_multi(db, limit=2)
+    assert second == crud.license_domain.get_multi(db, skip=2, limit=2)
+    # cursors stay valid when rows before them are removed
+    db.delete(first[0])
+    db.commit()
+    assert crud.license_domain.get_page(db, cursor=cursor, limit=2)[0] == second
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "WzFd", "WyJhIiwgImIiXQ"])
+def test_decode_cursor_rejects_invalid_cursors(cursor: str) -> None:
+    with pytest.raises(ValueError):
+        crud.license.decode_cursor(cursor)
+
+
+def test_async_variants_match(db: Session) -> None:
+    add_licenses(db, 7)
+    expected = crud.license.get_multi(db, limit=100)
+
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+            await connection.execute(models.License.__table__.insert(), [
+                {column.name: getattr(license, column.name) for column in models.License.__table__.columns}
+                for license in expected
+            ])
+        async with AsyncSession(engine) as async_db:
+            seen = []
+            cursor = None
+            while True:
+                page, cursor = await crud.license.aget_page(async_db, cursor=cursor, limit=3)
+                seen.extend(page)
+                if cursor is None:
+                    break
+            assert [license.id for license in seen] == [license.id for license in expected]
+            assert [license.id for license in await crud.license.aget_multi(async_db, skip=2, limit=2)] == [license.id for license in expected[2:4]]
+            assert (await crud.license.aget(async_db, expected[0].id)).name == expected[0].name
+        await engine.dispose()
+
+    asyncio.run(main())
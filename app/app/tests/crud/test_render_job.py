@@ -0,0 +1,60 @@
+import datetime
+
+from sqlmodel import Session
+
+from app import crud, models
+from app.tests.utils.license import build_license
+
+
+def add_job(db: Session, **values: object) -> models.RenderJob:
+    license = build_license()
+    db.add(license)
+    db.commit()
+    job = models.RenderJob(license_id=license.id, git_sha=license.git_commit_hash, **values)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_claim_marks_job_running_once(db: Session) -> None:
+    job = add_job(db)
+    claimed = crud.render_job.claim(db, id=job.id, max_attempts=3)
+    assert claimed.status == "running"
+    assert claimed.attempts == 1
+    assert crud.render_job.claim(db, id=job.id, max_attempts=3) is None
+    assert crud.render_job.get_pending_ids(db) == []
+
+
+def test_claim_skips_jobs_without_attempts_left(db: Session) -> None:
+    job = add_job(db, attempts=3)
+    assert crud.render_job.claim(db, id=job.id, max_attempts=3) is None
+    assert crud.render_job.claim(db, id=job.id, max_attempts=4).attempts == 4
+
+
+def test_requeue_stale(db: Session) -> None:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    stale = add_job(db, status="running", updated_at=now - datetime.timedelta(minutes=10))
+    running = add_job(db, status="running", updated_at=now)
+    exhausted = add_job(db, status="running", attempts=3, updated_at=now - datetime.timedelta(minutes=10))
+    assert crud.render_job.requeue_stale(db, older_than=now - datetime.timedelta(minutes=5), max_attempts=3) == 1
+    db.expire_all()
+    assert crud.render_job.get(db, id=stale.id).status == "pending"
+    assert crud.render_job.get(db, id=running.id).status == "running"
+    assert crud.render_job.get_pending_ids(db) == [stale.id]
+    # a job that keeps killing its worker is given up on
+    failed = crud.render_job.get(db, id=exhausted.id)
+    assert failed.status == "failed"
+    assert failed.finished_at is not None
+
+
+def test_remove_expired(db: Session) -> None:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expired = add_job(db, status="finished", finished_at=now - datetime.timedelta(days=2)).id
+    failed = add_job(db, status="failed", finished_at=now - datetime.timedelta(days=2)).id
+    recent = add_job(db, status="finished", finished_at=now).id
+    pending = add_job(db).id
+    assert crud.render_job.remove_expired(db, older_than=now - datetime.timedelta(days=1)) == 2
+    assert crud.render_job.get(db, id=expired) is None
+    assert crud.render_job.get(db, id=failed) is None
+    assert crud.render_job.get(db, id=recent) is not None
+    assert crud.render_job.get(db, id=pending) is not None
@@ -0,0 +1,46 @@
+import datetime
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.core.rendering import build_restriction_snapshot
+from app.core.templates import current_template_sha
+from app.tests.utils.utils import random_lower_string
+
+
+def build_license(**values: Any) -> models.License:
+    """A license that is not stored, values override the defaults."""
+    defaults = dict(
+        timestamp=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        name="mylic",
+        license="OpenRAIL",
+        model=True,
+        git_commit_hash="0" * 40,
+    )
+    return models.License(**{**defaults, **values})
+
+
+def create_random_license(db: Session) -> models.License:
+    source = models.LicenseSource(name=random_lower_string())
+    domain = models.LicenseDomain(name=random_lower_string())
+    db.add_all([source, domain])
+    db.commit()
+    restriction = models.LicenseRestriction(text=random_lower_string(), approved=True, source_id=source.id, domain_id=domain.id)
+    db.add(restriction)
+    db.commit()
+    license_in = models.LicenseCreate(
+        timestamp=datetime.datetime.now(datetime.timezone.utc),
+        name=random_lower_string(),
+        license="OpenRAIL",
+        model=True,
+        restriction_ids=[restriction.id],
+    )
+    restrictions = crud.license_restriction.get_approved_by_ids(db, ids=license_in.restriction_ids)
+    return crud.license.create_with_restrictions(
+        db,
+        obj_in=license_in,
+        restrictions=restrictions,
+        git_commit_hash=current_template_sha(),
+        restriction_snapshot=build_restriction_snapshot(restrictions),
+    )
@@ -0,0 +1,39 @@
+import datetime
+import json
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from jinja2 import Template
+
+APP_DIR = Path(__file__).resolve().parents[2]
+
+
+def get_template_source(template_file: str) -> str:
+    return (APP_DIR / "templates" / template_file).read_text()
+
+
+def get_template_context() -> Dict[str, Any]:
+    """
+    Fixed context of a license with all artifacts and all initial restrictions.
+    """
+    with open(APP_DIR / "data" / "initial_restrictions.json") as f:
+        restrictions: Dict[str, List[str]] = {}
+        for restriction in json.load(f):
+            restrictions.setdefault(restriction["domain"], []).append(restriction["text"])
+    return dict(
+        ARTIFACTS=["Application", "Model", "Source Code"],
+        SHORT_ARTIFACT_NAME="AMS",
+        LICENSE_NAME="Golden",
+        RESTRICTIONS={
+            domain: [[chr(97 + index), text] for index, text in enumerate(texts)]
+            for domain, texts in restrictions.items()
+        },
+        LICENSE_TIMESTAMP=datetime.datetime(2024, 1, 1, 10, 36, 37),
+        LICENSE_ID=uuid.UUID(int=1),
+        LICENSE_TEMPLATE_VERSION="0" * 40,
+    )
+
+
+def render_template(template_file: str) -> str:
+    return Template(get_template_source(template_file)).render(**get_template_context())
@@ -8,3 +8,6 @@ alembic upgrade head
 
 # Create initial data in DB
 python /app/app/app/initial_data.py
+
+# Register the template versions, so that workers do not need the git history
+python /app/app/app/sync_templates.py